@@ -0,0 +1,117 @@
+import asyncio
+import inspect
+import logging
+import threading
+
+import aiohttp
+import edge_tts
+
+logger = logging.getLogger(__name__)
+
+# edge-tts 合成服务所在主机
+SERVICE_URL = "https://speech.platform.bing.com/"
+
+
+async def _noop():
+    pass
+
+
+class _SharedConnector(aiohttp.TCPConnector):
+    """跨会话共享的连接池：edge-tts 每次合成结束关闭自己的会话时不关闭连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.allow_close = False
+
+    def close(self):
+        if not self.allow_close:
+            return _noop()
+        return super().close()
+
+
+class AsyncRuntime:
+    """与程序同生命周期的后台事件循环线程，多次转换之间复用循环和预热的连接"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="tts-async-loop", daemon=True)
+        self._ready = threading.Event()
+        self._connector = None
+        # 旧版 edge-tts 不支持传入连接池
+        self._supports_connector = "connector" in inspect.signature(edge_tts.Communicate).parameters
+
+    def start(self):
+        """启动后台事件循环线程"""
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+        self.loop.close()
+
+    def submit(self, coro):
+        """从任意线程提交协程，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """从其他线程提交协程并阻塞等待结果"""
+        return self.submit(coro).result(timeout)
+
+    async def get_connector(self):
+        """获取共享连接池（必须在后台循环中调用）"""
+        if self._connector is None or self._connector.closed:
+            self._connector = _SharedConnector(
+                limit=20,  # 连接池大小
+                limit_per_host=16,
+                ttl_dns_cache=300,
+                use_dns_cache=True,
+                keepalive_timeout=60,
+            )
+        return self._connector
+
+    async def communicate_options(self):
+        """创建 edge_tts.Communicate 时附加的参数"""
+        if not self._supports_connector:
+            return {}
+        return {"connector": await self.get_connector()}
+
+    async def warm_up(self, connections=2):
+        """预先建立到合成服务的 TCP/TLS 连接并缓存 DNS，之后的请求可直接复用"""
+        if not self._supports_connector:
+            return
+        connector = await self.get_connector()
+        # 与 edge-tts 使用相同的 SSL 上下文，连接池才能命中同一个键
+        ssl_ctx = getattr(getattr(edge_tts, "communicate", None), "_SSL_CTX", None)
+        request_kwargs = {"ssl": ssl_ctx} if ssl_ctx is not None else {}
+
+        async def open_one(session):
+            async with session.head(SERVICE_URL, allow_redirects=False, **request_kwargs) as response:
+                await response.read()
+
+        try:
+            async with aiohttp.ClientSession(connector=connector, connector_owner=False, trust_env=True,
+                                             timeout=aiohttp.ClientTimeout(total=10)) as session:
+                await asyncio.gather(*[open_one(session) for _ in range(connections)])
+            logger.info(f"已预热 {connections} 个到合成服务的连接")
+        except Exception as e:
+            logger.warning(f"预热连接失败: {e}")
+
+    def stop(self):
+        """关闭连接池并停止后台循环"""
+        if not self._thread.is_alive():
+            return
+
+        async def shutdown():
+            if self._connector is not None:
+                self._connector.allow_close = True
+                await self._connector.close()
+
+        try:
+            self.run(shutdown(), timeout=2)
+        except Exception as e:
+            logger.warning(f"关闭连接池失败: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2)
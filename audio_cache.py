@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class AudioCache:
+    """按内容哈希寻址的持久化音频缓存，超出容量时按LRU淘汰"""
+
+    def __init__(self, cache_dir="tts_cache", max_bytes=500 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> 文件大小，按最近使用时间排序
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    @staticmethod
+    def normalize_text(text):
+        """规范化句子文本：统一Unicode形式并合并空白"""
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+
+    @classmethod
+    def make_key(cls, text, voice, rate="+0%", volume="+0%", pitch="+0Hz", namespace=""):
+        """根据句子文本、语音和韵律参数生成缓存键（namespace区分不同合成后端）"""
+        parts = [cls.normalize_text(text), voice, rate, volume, pitch]
+        if namespace:
+            parts.append(namespace)
+        payload = "\x1f".join(parts)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".mp3")
+
+    def _load_index(self):
+        """扫描缓存目录，按修改时间重建LRU顺序"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        found = []
+        for sub in os.listdir(self.cache_dir):
+            sub_dir = os.path.join(self.cache_dir, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in os.listdir(sub_dir):
+                if not name.endswith(".mp3"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(sub_dir, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name[:-4], stat.st_size))
+        found.sort()
+        for _, key, size in found:
+            self._entries[key] = size
+            self._total_bytes += size
+        logger.info(f"音频缓存已加载: {len(self._entries)} 个条目，共 {self._total_bytes / 1024 / 1024:.1f}MB")
+        with self._lock:
+            self._evict()
+
+    def get(self, key):
+        """查询缓存，命中时返回文件路径并刷新其LRU位置"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            if not os.path.exists(path):
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def get_bytes(self, key):
+        """命中时返回缓存的音频字节，否则返回None"""
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError as e:
+            logger.warning(f"读取缓存失败: {e}")
+            return None
+
+    def put_file(self, key, src_path):
+        """把已生成的音频文件写入缓存"""
+        self._store(key, os.path.getsize(src_path), lambda tmp_path: shutil.copyfile(src_path, tmp_path))
+
+    def put_bytes(self, key, data):
+        """把内存中的音频字节写入缓存"""
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        self._store(key, len(data), write)
+
+    def _store(self, key, size, write):
+        """先写临时文件再原子替换，避免读到不完整的缓存"""
+        if size <= 0 or size > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入缓存失败: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的条目，直到总大小不超过上限（需持有锁）"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+            logger.debug(f"淘汰缓存条目: {key}")
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for key in list(self._entries):
+                try:
+                    os.unlink(self._path(key))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self._total_bytes = 0
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def __len__(self):
+        return len(self._entries)
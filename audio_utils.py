@@ -0,0 +1,332 @@
+import io
+import logging
+import os
+import shutil
+
+logger = logging.getLogger(__name__)
+
+
+class ExportCancelled(Exception):
+    """导出被用户取消"""
+
+
+# 音频条目既可以是临时文件路径，也可以是内存中的MP3字节
+
+def is_in_memory(audio):
+    """音频条目是否保存在内存中"""
+    return isinstance(audio, (bytes, bytearray))
+
+
+def audio_exists(audio):
+    """音频条目是否有效"""
+    if not audio:
+        return False
+    if is_in_memory(audio):
+        return True
+    return os.path.exists(audio)
+
+
+def audio_size(audio):
+    """音频条目的字节数"""
+    if is_in_memory(audio):
+        return len(audio)
+    return os.path.getsize(audio)
+
+
+def open_audio(audio):
+    """以二进制只读文件对象打开音频条目"""
+    if is_in_memory(audio):
+        return io.BytesIO(audio)
+    return open(audio, 'rb')
+
+
+def write_audio(audio, dest_path):
+    """把音频条目写入目标文件"""
+    if is_in_memory(audio):
+        with open(dest_path, 'wb') as f:
+            f.write(audio)
+    else:
+        shutil.copy2(audio, dest_path)
+
+
+# Linux FICLONE ioctl：在支持写时复制的文件系统（btrfs、xfs等）上共享数据块
+_FICLONE = 0x40049409
+
+
+def link_or_copy(audio, dest_path):
+    """导出音频条目：同一文件系统优先硬链接，其次reflink，最后才复制数据"""
+    if is_in_memory(audio):
+        write_audio(audio, dest_path)
+        return "write"
+    if os.path.exists(dest_path):
+        os.unlink(dest_path)
+    try:
+        os.link(audio, dest_path)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        import fcntl
+        with open(audio, 'rb') as src, open(dest_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        return "reflink"
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(audio, dest_path)
+    return "copy"
+
+
+# MPEG音频帧头解析（只处理 Layer III，edge-tts 输出即为该格式）
+# 版本位: 0=MPEG2.5, 2=MPEG2, 3=MPEG1
+_BITRATES_KBPS = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_BITRATES_KBPS[0] = _BITRATES_KBPS[2]
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+_SCAN_BLOCK = 64 * 1024
+_COPY_CHUNK = 1024 * 1024
+
+
+def parse_frame_header(header):
+    """解析4字节帧头，返回 (帧长度, 每帧采样数, 采样率, 比特率索引)，无效时返回 None"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    padding = (header[2] >> 1) & 0x01
+    bitrate = _BITRATES_KBPS[version][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    if version == 3:
+        return 144 * bitrate // sample_rate + padding, 1152, sample_rate, bitrate_index
+    return 72 * bitrate // sample_rate + padding, 576, sample_rate, bitrate_index
+
+
+def _side_info_size(header):
+    """Layer III 边信息长度"""
+    mono = (header[3] >> 6) == 3
+    if (header[1] >> 3) & 0x03 == 3:
+        return 17 if mono else 32
+    return 9 if mono else 17
+
+
+def _is_info_frame(frame_start):
+    """判断第一帧是否为 Xing/Info/VBRI 元数据帧"""
+    offset = 4 + _side_info_size(frame_start)
+    if not frame_start[1] & 0x01:
+        offset += 2  # CRC
+    return frame_start[offset:offset + 4] in (b"Xing", b"Info") or frame_start[36:40] == b"VBRI"
+
+
+def scan_mp3(f):
+    """流式扫描MP3，跳过ID3v2/ID3v1标签和开头的Xing/Info帧
+
+    返回 (音频数据起始, 结束, 帧数, 首帧头, 比特率索引集合)；只按块读取帧头，内存占用恒定。
+    """
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    start = 0
+
+    f.seek(0)
+    head = f.read(10)
+    if head[:3] == b"ID3" and len(head) == 10:
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+    if end - start >= 128:
+        f.seek(end - 128)
+        if f.read(3) == b"TAG":
+            end -= 128
+
+    data_start = None
+    data_end = start
+    frames = 0
+    first_header = None
+    bitrate_indices = set()
+
+    pos = start
+    buf = b""
+    buf_pos = start
+    while pos + 4 <= end:
+        offset = pos - buf_pos
+        if offset < 0 or offset + 4 > len(buf):
+            f.seek(pos)
+            buf = f.read(min(_SCAN_BLOCK, end - pos))
+            buf_pos = pos
+            offset = 0
+            if len(buf) < 4:
+                break
+
+        info = parse_frame_header(buf[offset:offset + 4])
+        if info is None or pos + info[0] > end:
+            # 不是有效帧，寻找下一个同步字节
+            next_sync = buf.find(b"\xff", offset + 1)
+            pos = buf_pos + (next_sync if next_sync != -1 else len(buf))
+            continue
+
+        frame_length = info[0]
+        if first_header is None:
+            if offset + 48 > len(buf):
+                f.seek(pos)
+                buf = f.read(min(_SCAN_BLOCK, end - pos))
+                buf_pos = pos
+                offset = 0
+            first_header = bytes(buf[offset:offset + 4])
+            if _is_info_frame(buf[offset:offset + frame_length]):
+                # 片段自带的时长信息帧，合并后不再正确，丢弃
+                first_header = None
+                pos += frame_length
+                continue
+
+        if data_start is None:
+            data_start = pos
+        frames += 1
+        bitrate_indices.add(info[3])
+        pos += frame_length
+        data_end = pos
+
+    if data_start is None:
+        return start, start, 0, None, bitrate_indices
+    return data_start, data_end, frames, first_header, bitrate_indices
+
+
+def _build_info_frame(first_header, frames, total_bytes, toc, vbr):
+    """构造写在文件开头的 Xing/Info 帧（帧数、字节数和100项寻址表）"""
+    side = _side_info_size(first_header)
+    needed = 4 + side + 4 + 4 + 4 + 4 + 100
+    bitrate_index = first_header[2] >> 4
+    while True:
+        # 不带CRC、不填充，必要时提高比特率让帧足够放下信息
+        header = bytes([first_header[0], first_header[1] | 0x01,
+                        (bitrate_index << 4) | (first_header[2] & 0x0C), first_header[3]])
+        frame_length = parse_frame_header(header)[0]
+        if frame_length >= needed or bitrate_index >= 14:
+            break
+        bitrate_index += 1
+
+    body = bytearray(frame_length)
+    body[:4] = header
+    offset = 4 + side
+    body[offset:offset + 4] = b"Xing" if vbr else b"Info"
+    body[offset + 4:offset + 8] = (0x07).to_bytes(4, "big")  # 帧数 | 字节数 | TOC
+    body[offset + 8:offset + 12] = frames.to_bytes(4, "big")
+    body[offset + 12:offset + 16] = total_bytes.to_bytes(4, "big")
+    body[offset + 16:offset + 116] = bytes(toc)
+    return bytes(body)
+
+
+def _build_toc(segments, info_length, total_bytes):
+    """按各片段 (帧数, 字节数) 分段线性插值计算寻址表"""
+    total_frames = sum(frames for frames, _ in segments)
+    toc = []
+    index = 0
+    frames_before = 0
+    bytes_before = info_length
+    for percent in range(100):
+        target = total_frames * percent / 100
+        while index < len(segments) - 1 and frames_before + segments[index][0] <= target:
+            frames_before += segments[index][0]
+            bytes_before += segments[index][1]
+            index += 1
+        frames, length = segments[index] if segments else (0, 0)
+        position = bytes_before + (length * (target - frames_before) / frames if frames else 0)
+        toc.append(min(255, int(position / total_bytes * 256)))
+    return toc
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _copy_range(audio, out_fd, start, length):
+    """把音频条目的 [start, start+length) 写入输出，文件优先使用内核拷贝"""
+    if is_in_memory(audio):
+        _write_all(out_fd, memoryview(audio)[start:start + length])
+        return
+    with open(audio, 'rb') as src:
+        if hasattr(os, "sendfile"):
+            try:
+                offset = start
+                remaining = length
+                while remaining > 0:
+                    sent = os.sendfile(out_fd, src.fileno(), offset, min(remaining, _COPY_CHUNK * 16))
+                    if sent == 0:
+                        break
+                    offset += sent
+                    remaining -= sent
+                if remaining == 0:
+                    return
+                start, length = offset, remaining
+            except OSError:
+                pass  # 不支持文件到文件的 sendfile，退回普通拷贝
+        src.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = src.read(min(remaining, _COPY_CHUNK))
+            if not chunk:
+                break
+            _write_all(out_fd, chunk)
+            remaining -= len(chunk)
+
+
+def combine_audio_files(audio_files, output_path, should_cancel=None, on_progress=None):
+    """流式合并MP3片段
+
+    只在开头写一个带正确帧数和寻址表的 Xing/Info 帧，去掉各片段自带的ID3和Xing
+    元数据，音频数据按块（或内核拷贝）写入，内存占用与总时长无关。
+    should_cancel 返回 True 时抛出 ExportCancelled；on_progress(已写入, 总数) 在每个片段写入后调用，
+    总数为去掉缺失和空片段后的片段数。
+    """
+    segments = []  # (音频条目, 数据起始, 数据长度, 帧数)
+    first_header = None
+    bitrate_indices = set()
+    for audio in audio_files:
+        if should_cancel and should_cancel():
+            raise ExportCancelled()
+        if not audio_exists(audio):
+            continue
+        with open_audio(audio) as f:
+            data_start, data_end, frames, header, indices = scan_mp3(f)
+        if data_end <= data_start:
+            continue
+        if first_header is None:
+            first_header = header
+        elif header is not None and (header[1] != first_header[1] or (header[2] & 0x0C) != (first_header[2] & 0x0C)):
+            logger.warning("合并的音频片段采样格式不一致，播放器可能无法正确计算时长")
+        bitrate_indices |= indices
+        segments.append((audio, data_start, data_end - data_start, frames))
+
+    out_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        info_length = 0
+        if first_header is not None:
+            # 先占位，数据写完后再回填信息帧
+            info_length = len(_build_info_frame(first_header, 0, 0, [0] * 100, False))
+            _write_all(out_fd, bytes(info_length))
+        for written, (audio, start, length, _) in enumerate(segments, 1):
+            if should_cancel and should_cancel():
+                raise ExportCancelled()
+            _copy_range(audio, out_fd, start, length)
+            if on_progress:
+                on_progress(written, len(segments))
+
+        if first_header is not None:
+            total_bytes = os.lseek(out_fd, 0, os.SEEK_CUR)
+            total_frames = sum(frames for *_, frames in segments)
+            toc = _build_toc([(frames, length) for _, _, length, frames in segments], info_length, total_bytes)
+            info_frame = _build_info_frame(first_header, total_frames, total_bytes, toc, len(bitrate_indices) > 1)
+            os.lseek(out_fd, 0, os.SEEK_SET)
+            _write_all(out_fd, info_frame)
+    finally:
+        os.close(out_fd)
+    logger.info(f"合并 {len(segments)} 个音频片段到: {output_path}")
@@ -0,0 +1,238 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from config import Config
+from log_setup import LOG_LEVELS
+from metrics import REGISTRY
+from audio_cache import AudioCache
+from audio_utils import combine_audio_files
+from retry_policy import PERMANENT, classify_error
+from scheduler import AdaptiveConcurrency
+from synthesis import SentenceSynthesizer
+from text_splitter import split_chunk_spans, split_language_spans, language_for_voice
+from voice_catalog import VoiceCatalog
+from tts_backends import SynthesisError, create_backend
+
+logger = logging.getLogger(__name__)
+
+
+def build_parser():
+    """命令行参数"""
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="无界面批量转换：把文本文件转换为MP3音频",
+    )
+    parser.add_argument("--input", nargs="+", required=True, help="输入的文本文件或目录")
+    parser.add_argument("--out", required=True, help="输出目录")
+    parser.add_argument("--voice", help="语音名称，默认使用配置文件中的语音")
+    parser.add_argument("--rate", help="语速，如 +10%%")
+    parser.add_argument("--volume", help="音量，如 -5%%")
+    parser.add_argument("--pitch", help="音调，如 +2Hz")
+    parser.add_argument("--pattern", default=".txt", help="目录中要处理的文件后缀（默认 .txt）")
+    parser.add_argument("--concurrency", type=int, help="所有文件共享的最大并发请求数，默认使用配置中的线程数")
+    parser.add_argument("--max-documents", type=int, default=4, help="同时处理的文件数上限")
+    parser.add_argument("--encoding", default="utf-8", help="输入文件编码")
+    parser.add_argument("--chunk-chars", type=int, help="相邻短句合并为一个请求的目标字数，0 为不合并")
+    parser.add_argument("--max-chunk-chars", type=int, help="单个请求的最大字数，超过时在分句标点处切开，0 为不切分")
+    parser.add_argument("--no-auto-language", action="store_true", help="不逐句检测语言，全文使用同一个语音")
+    parser.add_argument("--no-cache", action="store_true", help="不使用持久化音频缓存")
+    parser.add_argument("--log-level", type=str.upper, choices=LOG_LEVELS, help="日志级别，默认使用配置中的 log_level")
+    parser.add_argument("--metrics", help="结束时写出性能指标快照的路径（.prom 为 Prometheus 文本格式，其余为 JSON）")
+    parser.add_argument("--backend", choices=["edge", "fake"], help="合成后端，fake 为离线模拟后端")
+    parser.add_argument("--fake-latency", type=float, help="模拟后端的平均延迟（秒）")
+    parser.add_argument("--fake-jitter", type=float, help="模拟后端的延迟抖动（秒）")
+    parser.add_argument("--fake-failure-rate", type=float, help="模拟后端的失败率")
+    parser.add_argument("--fake-throttle-rate", type=float, help="模拟后端的限流率")
+    return parser
+
+
+def collect_inputs(paths, suffix=".txt"):
+    """展开输入路径，目录按文件名排序后取其中指定后缀的文件"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full_path = os.path.join(path, name)
+                if os.path.isfile(full_path) and name.endswith(suffix):
+                    files.append(full_path)
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            logger.warning(f"输入不存在，已跳过: {path}")
+    return files
+
+
+def output_paths(files, out_dir):
+    """每个输入文件对应的输出路径
+
+    输出文件以输入文件名命名，不同目录下的同名文件按输入顺序依次加上 _2、_3 等后缀，
+    不会互相覆盖。文件名按不区分大小写比较，Windows 上同样不冲突。
+    """
+    used = set()
+    paths = []
+    for path in files:
+        base_name = os.path.splitext(os.path.basename(path))[0]
+        name = base_name
+        suffix = 1
+        while name.lower() in used:
+            suffix += 1
+            name = f"{base_name}_{suffix}"
+        if name != base_name:
+            logger.warning(f"{path} 的输出文件名 {base_name}.mp3 已被占用，改为 {name}.mp3")
+        used.add(name.lower())
+        paths.append(os.path.join(out_dir, f"{name}.mp3"))
+    return paths
+
+
+async def convert_document(path, output_path, synthesizer, limiter, settings, encoding="utf-8"):
+    """转换单个文件：分割句子、在全局并发窗口内合成，最后合并为 output_path
+
+    重试后仍有句子失败时抛出 SynthesisError，不写出不完整的文件。
+    """
+    start_time = time.time()
+    with open(path, "r", encoding=encoding) as f:
+        text = f.read()
+
+    language = settings.get("language") or language_for_voice(settings["voice"])
+    target_chars, max_chars = settings.get("target_chars", 80), settings.get("max_chars", 200)
+    voice_by_language = settings.get("voice_by_language")
+    if voice_by_language is not None:
+        # 逐句检测语言，每句使用对应语言的语音
+        spans, languages = split_language_spans(text, language, target_chars, max_chars)
+        voices = [voice_by_language(sentence_language) for sentence_language in languages]
+    else:
+        spans = split_chunk_spans(text, language, target_chars, max_chars)
+        voices = [settings["voice"]] * len(spans)
+    sentences = [text[start:end] for start, end in spans]
+    if not sentences:
+        logger.warning(f"{path} 没有可转换的句子")
+        return None
+
+    audio_files = [None] * len(sentences)
+
+    async def convert_one(index):
+        await limiter.acquire()
+        request_start = time.monotonic()
+        try:
+            audio_data, cached, _ = await synthesizer.synthesize(
+                sentences[index], voices[index], settings["rate"], settings["volume"], settings["pitch"],
+                index=index, limiter=limiter)
+        except Exception:
+            await limiter.release(ok=False)
+            raise
+        latency = None if cached else time.monotonic() - request_start
+        await limiter.release(latency, size=len(sentences[index]))
+        audio_files[index] = audio_data
+
+    errors = {}  # 句子索引 -> 异常
+
+    async def convert_all(indices):
+        # 固定数量的工作协程依次从共享的迭代器中取句子，不为每句创建一个排队等待窗口的协程
+        pending = iter(indices)
+
+        async def worker():
+            for index in pending:
+                try:
+                    await convert_one(index)
+                except Exception as e:
+                    errors[index] = e
+
+        await asyncio.gather(*[worker() for _ in range(min(limiter.ceiling, len(indices)))])
+
+    await convert_all(range(len(sentences)))
+
+    # 最终重试：非永久性错误的句子再补转一轮
+    retry_indices = [i for i, error in sorted(errors.items()) if classify_error(error) != PERMANENT]
+    if retry_indices:
+        logger.info(f"{path} 最终重试 {len(retry_indices)} 个失败的句子")
+        for index in retry_indices:
+            del errors[index]
+        await convert_all(retry_indices)
+    failed = sorted(errors)
+    if failed:
+        # 不写出缺句的音频，整个文件计为失败
+        raise SynthesisError(f"{len(failed)}/{len(sentences)} 个句子转换失败: {[i + 1 for i in failed[:20]]}")
+
+    await asyncio.to_thread(combine_audio_files, [a for a in audio_files if a], output_path)
+    logger.info(f"{path} -> {output_path}，{len(sentences)} 句，耗时: {time.time() - start_time:.2f}s")
+    return output_path
+
+
+async def run_batch(files, out_dir, settings, concurrency, max_documents, cache=None, encoding="utf-8", backend=None):
+    """批量转换，所有文件共享同一个并发窗口"""
+    synthesizer = SentenceSynthesizer(cache, backend)
+    limiter = AdaptiveConcurrency(concurrency)
+    document_slots = asyncio.Semaphore(max_documents)
+
+    async def convert_with_slot(path, output_path):
+        async with document_slots:
+            return await convert_document(path, output_path, synthesizer, limiter, settings, encoding)
+
+    return await asyncio.gather(*[convert_with_slot(path, output_path)
+                                  for path, output_path in zip(files, output_paths(files, out_dir))],
+                                return_exceptions=True)
+
+
+def main(argv=None):
+    """命令行入口，返回进程退出码"""
+    args = build_parser().parse_args(argv)
+    if args.log_level:
+        logging.getLogger().setLevel(args.log_level)
+    config = Config()
+    last_settings = config.get_last_settings()
+    settings = {
+        "voice": args.voice or last_settings["voice"],
+        "rate": args.rate or last_settings["rate"],
+        "volume": args.volume or last_settings["volume"],
+        "pitch": args.pitch or last_settings["pitch"],
+    }
+    # 分句规则取自本地缓存的语音目录中的地区信息，不联网
+    catalog_settings = config.get_voice_catalog_settings()
+    catalog = VoiceCatalog(catalog_settings["cache_path"], catalog_settings["ttl_seconds"]).load()
+    settings["language"] = catalog.language_for(settings["voice"])
+    language_settings = config.get_language_settings()
+    if language_settings["auto_detect"] and not args.no_auto_language:
+        settings["voice_by_language"] = lambda language: catalog.voice_for(
+            settings["voice"], language, language_settings["voices"])
+    chunk_settings = config.get_chunk_settings()
+    settings["target_chars"] = chunk_settings["target_chars"] if args.chunk_chars is None else args.chunk_chars
+    settings["max_chars"] = chunk_settings["max_chars"] if args.max_chunk_chars is None else args.max_chunk_chars
+    concurrency = args.concurrency or last_settings["max_workers"]
+
+    files = collect_inputs(args.input, args.pattern)
+    if not files:
+        logger.error("没有找到要转换的文件")
+        return 1
+    os.makedirs(args.out, exist_ok=True)
+
+    cache = None
+    cache_settings = config.get_cache_settings()
+    if cache_settings["enabled"] and not args.no_cache:
+        cache = AudioCache(cache_settings["cache_dir"], cache_settings["max_bytes"])
+
+    backend_settings = config.get_backend_settings()
+    fake_options = dict(backend_settings["fake_options"])
+    for key in ("latency", "jitter", "failure_rate", "throttle_rate"):
+        value = getattr(args, f"fake_{key}")
+        if value is not None:
+            fake_options[key] = value
+    backend = create_backend(args.backend or backend_settings["name"], **fake_options)
+
+    start_time = time.time()
+    logger.info(f"开始批量转换 {len(files)} 个文件，语音: {settings['voice']}，并发上限: {concurrency}")
+    results = asyncio.run(run_batch(files, args.out, settings, concurrency, args.max_documents, cache,
+                                    args.encoding, backend))
+
+    failed = 0
+    for path, result in zip(files, results):
+        if isinstance(result, Exception):
+            failed += 1
+            logger.error(f"{path} 转换失败: {result}")
+    logger.info(f"批量转换结束: 成功 {len(files) - failed} 个，失败 {failed} 个，总耗时: {time.time() - start_time:.2f}s")
+    metrics_path = args.metrics or config.get_metrics_path()
+    if metrics_path:
+        REGISTRY.write_snapshot(metrics_path)
+    return 1 if failed else 0
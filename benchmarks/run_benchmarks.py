@@ -0,0 +1,377 @@
+"""性能基准：冷启动、分句分块、高亮定位、音频合并和端到端转换
+
+用法:
+    python benchmarks/run_benchmarks.py [--quick] [--output result.json]
+
+结果以JSON输出，便于在版本之间比较。
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from audio_utils import combine_audio_files  # noqa: E402
+from batch_cli import run_batch  # noqa: E402
+from text_splitter import split_language_spans  # noqa: E402
+from tts_backends import FakeTTSBackend, MP3_FRAME_HEADER, MP3_FRAME_SIZE  # noqa: E402
+
+# 冷启动预算：导入 main 模块（窗口出现前的全部导入）不应超过该时间
+STARTUP_BUDGET_MS = 300
+# 启动时不应加载的模块，它们在首次转换或播放时才导入
+DEFERRED_MODULES = ("pygame", "edge_tts", "aiohttp", "asyncio")
+
+# 各语言的示例段落，重复拼接到目标大小；mixed 为中英夹杂的文本，需要逐句检测语言
+SAMPLE_TEXT = {
+    "zh": "今天天气很好，我们一起去公园散步吧。你觉得怎么样？当然好了！\n",
+    "ja": "今日はいい天気ですね。一緒に公園へ散歩に行きませんか？もちろんです！\n",
+    "en": "The weather is nice today. Shall we take a walk in the park? Of course!\n",
+    "mixed": "今天天气很好。The weather is nice today. 我们一起去公园散步吧！Version 3.14 is out.\n",
+}
+# 与配置默认值相同的分块参数
+TARGET_CHARS = 80
+MAX_CHARS = 200
+
+
+def make_text(language, size):
+    """生成约 size 字节（UTF-8）的文本"""
+    sample = SAMPLE_TEXT[language]
+    repeat = max(1, size // len(sample.encode("utf-8")))
+    return sample * repeat
+
+
+def timed(func, repeat=3):
+    """执行多次，返回最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def parse_importtime(output):
+    """解析 -X importtime 的输出，返回 [(模块, 自身微秒, 累计微秒, 层级)]"""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        head, cumulative_us, name = line.split("|", 2)
+        self_us = head.split(":", 1)[1]
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return entries
+
+
+def bench_startup(budget_ms=STARTUP_BUDGET_MS, top=10):
+    """冷启动：在新进程中用 -X importtime 导入 main，给出耗时分解并检查延迟加载的模块"""
+    code = f"import main, sys; print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT_DIR,
+                          capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1:] or "导入失败"}
+
+    entries = parse_importtime(proc.stderr)
+    main_us = next((cumulative for name, _, cumulative, level in entries if name == "main" and level == 0), 0)
+    # main 直接导入的模块按累计耗时排序，即窗口出现前各依赖的开销
+    direct = []
+    in_main = False
+    for name, self_us, cumulative, level in reversed(entries):
+        if level == 0:
+            in_main = name == "main"
+        elif in_main and level == 1:
+            direct.append({"module": name, "cumulative_ms": cumulative / 1000})
+    direct.sort(key=lambda entry: entry["cumulative_ms"], reverse=True)
+    loaded = [name for name in proc.stdout.strip().split(",") if name]
+    return {
+        "import_main_ms": main_us / 1000,
+        "process_wall_ms": wall_ms,
+        "budget_ms": budget_ms,
+        "within_budget": main_us / 1000 <= budget_ms,
+        "deferred_modules_loaded": loaded,
+        "top_imports": direct[:top],
+    }
+
+
+def bench_split(sizes):
+    """分句分块吞吐量：与界面和批量转换默认使用的路径相同（逐句检测语言并合并短句）"""
+    results = []
+    for language in SAMPLE_TEXT:
+        default_language = "zh" if language == "mixed" else language
+        for size in sizes:
+            text = make_text(language, size)
+            outputs = []
+
+            def split():
+                pieces = []
+                chunks, _ = split_language_spans(text, default_language, TARGET_CHARS, MAX_CHARS, pieces)
+                outputs.append((chunks, pieces))
+            elapsed = timed(split, repeat=1 if size >= 1 << 22 else 3)
+            chunks, pieces = outputs[-1]
+            byte_size = len(text.encode("utf-8"))
+            results.append({
+                "language": language,
+                "bytes": byte_size,
+                "sentences": len(pieces),
+                "chunks": len(chunks),
+                "seconds": elapsed,
+                "mb_per_second": byte_size / elapsed / 1024 / 1024,
+            })
+    return results
+
+
+# 分句回归用例：(文本, 默认语言, 期望的句子)。标题、列表和逐行书写的英文都要按行断句
+SPLIT_CASES = [
+    ("Line one\nLine two\nLine three", "en", ["Line one", "Line two", "Line three"]),
+    ("第一章\n2024年的故事开始了。", "zh", ["第一章", "2024年的故事开始了"]),
+    ("# Heading\n- item one\n- item two", "en", ["# Heading", "- item one", "- item two"]),
+    ("Pi is 3.14. Version v1.2 works.", "en", ["Pi is 3.14", "Version v1.2 works"]),
+    ("他说 OK.然后走了。", "zh", ["他说 OK", "然后走了"]),
+]
+
+
+def check_split_cases(cases=SPLIT_CASES):
+    """默认分句路径的回归检查，返回与期望不符的用例"""
+    failures = []
+    for text, language, expected in cases:
+        spans, _ = split_language_spans(text, language, 0, 0)
+        sentences = [text[start:end] for start, end in spans]
+        if sentences != expected:
+            failures.append({"text": text, "expected": expected, "actual": sentences})
+    return {"cases": len(cases), "failures": failures}
+
+
+def legacy_sentence_start(text, sentences, index):
+    """旧实现：每次从头扫描前面所有句子"""
+    start_pos = 0
+    for i in range(index):
+        start_pos = text.find(sentences[i], start_pos) + len(sentences[i])
+    return text.find(sentences[index], start_pos)
+
+
+class _NullText:
+    """没有显示器时代替 Tk 文本框，只测量定位本身"""
+
+    def tag_add(self, tag, start, end):
+        pass
+
+    def tag_remove(self, tag, start, end):
+        pass
+
+
+def make_reader(text, widget):
+    """只带分块和原句位置的阅读器实例，高亮和点击定位走 main.TTSReader 的实际方法"""
+    from main import TTSReader
+    pieces = []
+    chunks, _ = split_language_spans(text, "zh", TARGET_CHARS, MAX_CHARS, pieces)
+    reader = TTSReader.__new__(TTSReader)
+    reader.text_widget = widget
+    reader.window_offset = 0
+    reader.sentence_spans = chunks
+    reader.sentence_starts = [start for start, _ in chunks]
+    reader.piece_spans = pieces
+    reader.piece_starts = [start for start, _ in pieces]
+    return reader
+
+
+def bench_highlight(counts):
+    """高亮/点击定位开销随句子数的变化；有显示器时同时测量 Tk 标签操作"""
+    tk_skip_reason = None
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        root.withdraw()
+    except Exception as e:
+        root = None
+        tk_skip_reason = str(e)
+
+    results = []
+    for count in counts:
+        text = "".join(f"第{i}句测试文本。" for i in range(count))
+        reader = make_reader(text, _NullText())
+        chunk_count = len(reader.sentence_spans)
+        probes = range(0, chunk_count, max(1, chunk_count // 200))
+        click_offsets = [reader.sentence_starts[i] + 1 for i in probes]
+
+        def click_lookup():
+            # 与 on_text_click 相同：先找原句，再找原句所在的分块
+            for offset in click_offsets:
+                piece = bisect.bisect_right(reader.piece_starts, offset) - 1
+                bisect.bisect_right(reader.sentence_starts, reader.piece_starts[piece])
+
+        def piece_lookup():
+            for i in probes:
+                for piece in reader.sentence_pieces(i):
+                    reader.piece_text_range(piece)
+
+        entry = {
+            "sentences": len(reader.piece_spans),
+            "chunks": chunk_count,
+            "piece_lookup_us": timed(piece_lookup) / len(probes) * 1e6,
+            "click_lookup_us": timed(click_lookup) / len(probes) * 1e6,
+        }
+        if count <= 5000:
+            sentences = [text[a:b] for a, b in reader.piece_spans]
+            legacy_probes = range(0, len(sentences), max(1, len(sentences) // 20))
+            entry["legacy_scan_us"] = timed(
+                lambda: [legacy_sentence_start(text, sentences, i) for i in legacy_probes], repeat=1) / len(legacy_probes) * 1e6
+
+        if root is not None:
+            widget = tk.Text(root)
+            widget.insert("1.0", text)
+            reader.text_widget = widget
+
+            def tag_all():
+                for i in probes:
+                    widget.tag_remove("current", "1.0", "end")
+                    reader.tag_sentence("current", i)
+            entry["tk_highlight_us"] = timed(tag_all, repeat=1) / len(probes) * 1e6
+            widget.destroy()
+        results.append(entry)
+
+    if root is not None:
+        root.destroy()
+    return {"tk_skipped": tk_skip_reason, "results": results}
+
+
+def make_segment(frames):
+    """生成由静音帧组成的MP3片段"""
+    frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+    return frame * frames
+
+
+def bench_combine(counts, frames_per_segment=100):
+    """合并大量音频片段（内存片段和临时文件两种）"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "combined.mp3")
+        for count in counts:
+            segments = [make_segment(frames_per_segment) for _ in range(count)]
+            in_memory = timed(lambda: combine_audio_files(segments, output_path), repeat=1)
+
+            paths = []
+            for i, segment in enumerate(segments):
+                path = os.path.join(tmp_dir, f"seg_{i}.mp3")
+                with open(path, "wb") as f:
+                    f.write(segment)
+                paths.append(path)
+            on_disk = timed(lambda: combine_audio_files(paths, output_path), repeat=1)
+            for path in paths:
+                os.unlink(path)
+
+            total_mb = sum(len(s) for s in segments) / 1024 / 1024
+            results.append({
+                "segments": count,
+                "total_mb": total_mb,
+                "in_memory_seconds": in_memory,
+                "on_disk_seconds": on_disk,
+                "on_disk_mb_per_second": total_mb / on_disk,
+            })
+    return results
+
+
+# 转换基准中逐句检测语言后使用的语音
+CONVERSION_VOICES = {"zh": "zh-CN-XiaoxiaoNeural", "en": "en-US-AriaNeural"}
+
+
+def make_conversion_text(sentence_count):
+    """每五句夹一句英文，转换时与默认设置一样逐句检测语言、切换语音"""
+    return "".join(f"Sentence number {i} is written in English. " if i % 5 == 4 else f"这是第{i}个用于测试转换吞吐量的句子。"
+                   for i in range(sentence_count))
+
+
+def bench_conversion(runs, latency=0.05, jitter=0.02, chunk_sizes=(0, 80)):
+    """使用模拟后端测量端到端转换吞吐量（chunk_chars 为 0 时每句一个请求）
+
+    runs 为 [(句子数, 并发数), ...]；句子数较大的一组用来观察调度开销是否随句子数线性增长。
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_paths = {}
+        for sentence_count, _ in runs:
+            if sentence_count not in input_paths:
+                input_paths[sentence_count] = os.path.join(tmp_dir, f"doc_{sentence_count}.txt")
+                with open(input_paths[sentence_count], "w", encoding="utf-8") as f:
+                    f.write(make_conversion_text(sentence_count))
+        for chunk_chars in chunk_sizes:
+            settings = {"voice": CONVERSION_VOICES["zh"], "rate": "+0%", "volume": "+0%", "pitch": "+0Hz",
+                        "language": "zh", "target_chars": chunk_chars, "max_chars": MAX_CHARS,
+                        "voice_by_language": lambda language: CONVERSION_VOICES.get(language, CONVERSION_VOICES["zh"])}
+            for sentence_count, concurrency in runs:
+                backend = FakeTTSBackend(latency=latency, jitter=jitter, seed=1)
+                start = time.perf_counter()
+                asyncio.run(run_batch([input_paths[sentence_count]], tmp_dir, settings, concurrency, 1,
+                                      backend=backend))
+                elapsed = time.perf_counter() - start
+                results.append({
+                    "concurrency": concurrency,
+                    "chunk_chars": chunk_chars,
+                    "sentences": sentence_count,
+                    "backend_latency": latency,
+                    "seconds": elapsed,
+                    "sentences_per_second": sentence_count / elapsed,
+                })
+    return results
+
+
+def run_all(quick=False):
+    """运行全部基准，返回结果字典"""
+    kb = 1024
+    if quick:
+        split_sizes = [kb, 100 * kb]
+        highlight_counts = [100, 1000]
+        combine_counts = [200]
+        conversion = [(100, 1), (100, 8), (2000, 16)]
+    else:
+        split_sizes = [kb, 10 * kb, 100 * kb, 1024 * kb, 10 * 1024 * kb]
+        highlight_counts = [100, 1000, 10000, 100000]
+        combine_counts = [1000, 5000]
+        conversion = [(500, 1), (500, 4), (500, 8), (500, 16), (20000, 16)]
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "startup": bench_startup(),
+        "split_checks": check_split_cases(),
+        "split_sentences": bench_split(split_sizes),
+        "highlight": bench_highlight(highlight_counts),
+        "combine_audio_files": bench_combine(combine_counts),
+        "conversion": bench_conversion(conversion),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TTS朗读器性能基准")
+    parser.add_argument("--quick", action="store_true", help="使用较小的输入快速运行")
+    parser.add_argument("--output", help="结果JSON的保存路径，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run_all(args.quick)
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        print(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,5 @@
 import json
 import os
-from datetime import datetime
 
 class Config:
     def __init__(self, config_file="tts_config.json"):
@@ -8,7 +7,42 @@ class Config:
         self.default_config = {
             "voice": "zh-CN-XiaoxiaoNeural",
             "max_workers": 8,
-            "history": []
+            "rate": "+0%",
+            "volume": "+0%",
+            "pitch": "+0Hz",
+            "stream_playback": True,
+            "in_memory_audio": True,
+            "sentence_gap_ms": 0,
+            "decode_lookahead": 2,
+            "chunk_target_chars": 80,
+            "chunk_max_chars": 200,
+            "backend": "edge",
+            "fake_backend": {
+                "latency": 0.5,
+                "jitter": 0.2,
+                "failure_rate": 0.0,
+                "throttle_rate": 0.0
+            },
+            "cache_enabled": True,
+            "cache_dir": "tts_cache",
+            "cache_max_mb": 500,
+            "metrics_path": "tts_metrics.json",
+            "log_level": "INFO",
+            "log_file": "tts_debug.log",
+            "log_max_kb": 1024,
+            "log_backups": 3,
+            "voice_catalog_path": "tts_voices.json",
+            "voice_catalog_ttl_hours": 168,
+            "auto_language": True,
+            "language_voices": {
+                "zh": "zh-CN-XiaoxiaoNeural",
+                "en": "en-US-AriaNeural",
+                "ja": "ja-JP-NanamiNeural"
+            },
+            "history_db": "tts_history.db",
+            "history_keep_audio": True,
+            "history_max_documents": 200,
+            "history_audio_documents": 20
         }
         self.config = self.load_config()
     
@@ -27,32 +61,85 @@ class Config:
         with open(self.config_file, 'w', encoding='utf-8') as f:
             json.dump(self.config, f, ensure_ascii=False, indent=2)
     
-    def add_history(self, text, voice, sentences_count):
-        """添加历史记录"""
-        history_item = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "text": text[:100] + "..." if len(text) > 100 else text,
-            "voice": voice,
-            "sentences_count": sentences_count
-        }
-        
-        self.config["history"].insert(0, history_item)
-        # 只保留最近20条记录
-        self.config["history"] = self.config["history"][:20]
-        self.save_config()
-    
-    def clear_history(self):
-        """清空历史记录"""
-        self.config["history"] = []
-        self.save_config()
-    
     def get_last_settings(self):
         """获取上次设置"""
         return {
             "voice": self.config.get("voice", "zh-CN-XiaoxiaoNeural"),
-            "max_workers": self.config.get("max_workers", 8)
+            "max_workers": self.config.get("max_workers", 8),
+            "rate": self.config.get("rate", "+0%"),
+            "volume": self.config.get("volume", "+0%"),
+            "pitch": self.config.get("pitch", "+0Hz"),
+            "stream_playback": self.config.get("stream_playback", True),
+            "in_memory_audio": self.config.get("in_memory_audio", True)
+        }
+    
+    def get_playback_settings(self):
+        """获取播放设置"""
+        return {
+            "sentence_gap_ms": max(0, int(self.config.get("sentence_gap_ms", 0))),
+            "decode_lookahead": max(1, int(self.config.get("decode_lookahead", 2)))
+        }
+    
+    def get_chunk_settings(self):
+        """获取合成分块设置"""
+        return {
+            "target_chars": max(0, int(self.config.get("chunk_target_chars", 80))),
+            "max_chars": max(0, int(self.config.get("chunk_max_chars", 200)))
+        }
+    
+    def get_backend_settings(self):
+        """获取合成后端设置"""
+        return {
+            "name": self.config.get("backend", "edge"),
+            "fake_options": self.config.get("fake_backend", self.default_config["fake_backend"])
+        }
+    
+    def get_cache_settings(self):
+        """获取音频缓存设置"""
+        return {
+            "enabled": self.config.get("cache_enabled", True),
+            "cache_dir": self.config.get("cache_dir", "tts_cache"),
+            "max_bytes": int(self.config.get("cache_max_mb", 500)) * 1024 * 1024
         }
     
+    def get_log_settings(self):
+        """获取日志设置"""
+        return {
+            "level": str(self.config.get("log_level", "INFO")).upper(),
+            "log_file": self.config.get("log_file", "tts_debug.log"),
+            "max_bytes": max(1, int(self.config.get("log_max_kb", 1024))) * 1024,
+            "backup_count": max(0, int(self.config.get("log_backups", 3)))
+        }
+    
+    def get_voice_catalog_settings(self):
+        """获取语音目录缓存设置"""
+        return {
+            "cache_path": self.config.get("voice_catalog_path", "tts_voices.json"),
+            "ttl_seconds": max(0.0, float(self.config.get("voice_catalog_ttl_hours", 168))) * 3600
+        }
+    
+    def get_language_settings(self):
+        """获取多语言设置：是否逐句检测语言，以及各语言使用的语音"""
+        voices = dict(self.default_config["language_voices"])
+        voices.update(self.config.get("language_voices") or {})
+        return {
+            "auto_detect": self.config.get("auto_language", True),
+            "voices": voices
+        }
+    
+    def get_history_settings(self):
+        """获取历史记录设置"""
+        return {
+            "db_path": self.config.get("history_db", "tts_history.db"),
+            "keep_audio": self.config.get("history_keep_audio", True),
+            "max_documents": max(1, int(self.config.get("history_max_documents", 200))),
+            "max_audio_documents": max(0, int(self.config.get("history_audio_documents", 20)))
+        }
+    
+    def get_metrics_path(self):
+        """性能指标快照的输出路径，为空时不在退出时写出"""
+        return self.config.get("metrics_path", "tts_metrics.json")
+    
     def update_settings(self, voice, max_workers):
         """更新设置"""
         self.config["voice"] = voice
@@ -0,0 +1,140 @@
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from audio_utils import ExportCancelled, audio_exists, combine_audio_files, link_or_copy
+
+logger = logging.getLogger(__name__)
+
+
+def sentence_filename(base_name, index, sentence):
+    """单句音频的文件名"""
+    safe_sentence = re.sub(r'[^\w\s-]', '', sentence[:20])  # 取前20个字符
+    safe_sentence = re.sub(r'[-\s]+', '_', safe_sentence)
+    return f"{base_name}_第{index+1:03d}句_{safe_sentence}.mp3"
+
+
+class AudioExportJob:
+    """后台导出任务：合并文件与单句文件并行写入，报告进度，可随时取消"""
+
+    def __init__(self, audio_files, sentences, save_path, save_sentences=False,
+                 on_progress=None, on_done=None, max_workers=4):
+        # 复制一份列表，导出期间文本被修改也不受影响；句子文本只在保存单句文件时才需要
+        self.audio_files = list(audio_files)
+        self.sentences = list(sentences) if save_sentences else []
+        self.save_path = save_path
+        self.save_sentences = save_sentences
+        self.on_progress = on_progress  # (已完成, 总数)，合并文件按片段计入
+        self.on_done = on_done  # (结果字典或None, 异常或None)
+        self.max_workers = max_workers
+        self._cancel_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tts-export", daemon=True)
+        self._written = []
+        self._progress_lock = threading.Lock()
+        self._combined_done = 0
+        self._sentences_done = 0
+        self._reported = 0
+        self._total = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """请求取消，已写出的文件会被删除"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def _write_sentence(self, index):
+        if self.cancelled:
+            raise ExportCancelled()
+        save_dir = os.path.dirname(self.save_path)
+        base_name = os.path.splitext(os.path.basename(self.save_path))[0]
+        path = os.path.join(save_dir, sentence_filename(base_name, index, self.sentences[index]))
+        method = link_or_copy(self.audio_files[index], path)
+        self._written.append(path)
+        logger.debug(f"保存单句音频({method}): {path}")
+        return method
+
+    def _write_combined(self, weight):
+        self._written.append(self.save_path)
+
+        def on_segment(written, segments):
+            self._report_progress(combined_done=written * weight // segments)
+        combine_audio_files(self.audio_files, self.save_path, should_cancel=lambda: self.cancelled,
+                            on_progress=on_segment)
+        return "combined"
+
+    def _report_progress(self, combined_done=None, sentence_done=False):
+        # 合并文件在自己的线程里逐片段报告，单句文件在完成时报告，两边汇总后再通知；
+        # 片段很多时每前进约 0.5% 才通知一次，避免界面事件堆积
+        with self._progress_lock:
+            if combined_done is not None:
+                self._combined_done = max(self._combined_done, combined_done)
+            if sentence_done:
+                self._sentences_done += 1
+            done = self._combined_done + self._sentences_done
+            if done - self._reported < max(1, self._total // 200) and done < self._total:
+                return
+            self._reported = done
+            # 在锁内通知，两个线程的进度不会乱序到达
+            if self.on_progress:
+                self.on_progress(done, self._total)
+
+    def _run(self):
+        result = None
+        error = None
+        sentence_indices = []
+        if self.save_sentences:
+            sentence_indices = [i for i, audio in enumerate(self.audio_files)
+                                if i < len(self.sentences) and audio_exists(audio)]
+        # 合并文件按片段数计入总进度，与单句文件的数量相当，进度条不会停在合并文件上不动
+        combined_weight = max(1, sum(1 for audio in self.audio_files if audio_exists(audio)))
+        self._total = combined_weight + len(sentence_indices)
+        methods = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tts-export-io") as pool:
+                # 合并文件和单句文件同时写出
+                futures = {pool.submit(self._write_combined, combined_weight): None}
+                futures.update((pool.submit(self._write_sentence, i), i) for i in sentence_indices)
+                try:
+                    for future in as_completed(futures):
+                        method = future.result()
+                        methods[method] = methods.get(method, 0) + 1
+                        if futures[future] is None:
+                            # 没有可合并的片段时也要计入
+                            self._report_progress(combined_done=combined_weight)
+                        else:
+                            self._report_progress(sentence_done=True)
+                except BaseException:
+                    self.cancel()
+                    raise
+            result = {
+                "save_path": self.save_path,
+                "sentence_files": len(sentence_indices),
+                "methods": methods,
+            }
+            logger.info(f"保存完成 - 主文件: {self.save_path}, 单句文件: {len(sentence_indices)}个, 方式: {methods}")
+        except ExportCancelled as e:
+            error = e
+            self._remove_written()
+            logger.info("导出已取消")
+        except Exception as e:
+            error = e
+            self._remove_written()
+            logger.error(f"保存失败: {str(e)}", exc_info=True)
+        if self.on_done:
+            self.on_done(result, error)
+
+    def _remove_written(self):
+        for path in self._written:
+            try:
+                if os.path.exists(path):
+                    os.unlink(path)
+            except OSError:
+                pass
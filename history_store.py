@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from audio_utils import is_in_memory
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_CHARS = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    voice TEXT NOT NULL,
+    rate TEXT NOT NULL,
+    volume TEXT NOT NULL,
+    pitch TEXT NOT NULL,
+    sentences_count INTEGER NOT NULL,
+    text_length INTEGER NOT NULL,
+    preview TEXT NOT NULL,
+    text BLOB NOT NULL,
+    spans BLOB
+);
+CREATE INDEX IF NOT EXISTS documents_created ON documents (created_at);
+CREATE TABLE IF NOT EXISTS document_audio (
+    document_id INTEGER NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+    sentence_index INTEGER NOT NULL,
+    audio_hash TEXT NOT NULL,
+    PRIMARY KEY (document_id, sentence_index)
+);
+CREATE INDEX IF NOT EXISTS document_audio_hash ON document_audio (audio_hash);
+CREATE TABLE IF NOT EXISTS audio_blobs (
+    audio_hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    timeline BLOB
+);
+"""
+
+
+class HistoryStore:
+    """转换历史：SQLite 保存完整文本（zlib压缩）、句子位置，以及可选的句子音频
+
+    所有数据库操作都在一个专用线程中执行，公开方法立即返回 Future，不阻塞界面线程。
+    相同音频在不同文档之间只存一份；每写入 compact_every 次清理一次超出上限的旧记录。
+    """
+
+    def __init__(self, db_path="tts_history.db", keep_audio=True, max_documents=200, max_audio_documents=20,
+                 compact_every=20):
+        self.db_path = db_path
+        self.keep_audio = keep_audio
+        self.max_documents = max_documents
+        self.max_audio_documents = max_audio_documents  # 只为最近这些文档保留音频
+        self.compact_every = compact_every
+        self._writes = 0
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-history")
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path)
+            # 必须在建表前设置，之后 compact 才能用 incremental_vacuum 归还空间
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def add(self, text, voice, rate, volume, pitch, spans=None, audio_files=None, timelines=None):
+        """记录一次转换（后台执行）；audio_files 为句子音频条目（字节或文件路径）"""
+        return self._executor.submit(self._add, text, voice, rate, volume, pitch,
+                                     list(spans or []), list(audio_files or []), list(timelines or []))
+
+    def list_documents(self, limit=200):
+        """最近的记录（后台执行），只包含预览，不解压全文"""
+        return self._executor.submit(self._list_documents, limit)
+
+    def load(self, document_id):
+        """读取完整记录（后台执行），含全文、句子和已保存的音频"""
+        return self._executor.submit(self._load, document_id)
+
+    def clear(self):
+        return self._executor.submit(self._clear)
+
+    def compact(self):
+        return self._executor.submit(self._compact)
+
+    def close(self):
+        """等待尚未完成的写入后关闭"""
+        def close_connection():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self._executor.submit(close_connection)
+        self._executor.shutdown(wait=True)
+
+    def _add(self, text, voice, rate, volume, pitch, spans, audio_files, timelines):
+        conn = self._connect()
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        span_data = array("l", [value for span in spans for value in span]).tobytes() if spans else None
+        with conn:
+            # 同一文本用相同设置再次转换时只保留最新的一条
+            conn.execute(
+                "DELETE FROM documents WHERE text_hash = ? AND voice = ? AND rate = ? AND volume = ? AND pitch = ?",
+                (text_hash, voice, rate, volume, pitch))
+            cursor = conn.execute(
+                "INSERT INTO documents (created_at, text_hash, voice, rate, volume, pitch, sentences_count,"
+                " text_length, preview, text, spans) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), text_hash, voice, rate, volume, pitch, len(spans),
+                 len(text), " ".join(text[:PREVIEW_CHARS].split()), zlib.compress(text.encode("utf-8")),
+                 span_data))
+            document_id = cursor.lastrowid
+            if self.keep_audio and audio_files and len(audio_files) == len(spans):
+                self._store_audio(conn, document_id, audio_files, timelines)
+        self._writes += 1
+        if self._writes % self.compact_every == 0:
+            self._compact()
+        return document_id
+
+    def _store_audio(self, conn, document_id, audio_files, timelines):
+        rows = []
+        for index, audio in enumerate(audio_files):
+            if not audio:
+                continue
+            if is_in_memory(audio):
+                data = bytes(audio)
+            else:
+                try:
+                    with open(audio, "rb") as f:
+                        data = f.read()
+                except OSError:
+                    continue
+            audio_hash = hashlib.sha256(data).hexdigest()
+            timeline = timelines[index] if index < len(timelines) else None
+            conn.execute("INSERT OR IGNORE INTO audio_blobs (audio_hash, data, timeline) VALUES (?, ?, ?)",
+                         (audio_hash, data, timeline.to_bytes() if timeline else None))
+            rows.append((document_id, index, audio_hash))
+        conn.executemany("INSERT INTO document_audio (document_id, sentence_index, audio_hash) VALUES (?, ?, ?)",
+                         rows)
+
+    def _list_documents(self, limit):
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT d.id, d.created_at, d.voice, d.sentences_count, d.text_length, d.preview,"
+            " EXISTS (SELECT 1 FROM document_audio a WHERE a.document_id = d.id)"
+            " FROM documents d ORDER BY d.id DESC LIMIT ?", (limit,)).fetchall()
+        return [
+            {"id": row[0], "timestamp": row[1], "voice": row[2], "sentences_count": row[3],
+             "text_length": row[4], "preview": row[5], "has_audio": bool(row[6])}
+            for row in rows
+        ]
+
+    def _load(self, document_id):
+        from word_timeline import WordTimeline
+
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT created_at, voice, rate, volume, pitch, text, spans FROM documents WHERE id = ?",
+            (document_id,)).fetchone()
+        if row is None:
+            return None
+        text = zlib.decompress(row[5]).decode("utf-8")
+        spans = []
+        if row[6]:
+            values = array("l")
+            values.frombytes(row[6])
+            spans = list(zip(values[0::2], values[1::2]))
+        audio_files = [None] * len(spans)
+        timelines = [None] * len(spans)
+        for index, data, timeline in conn.execute(
+                "SELECT a.sentence_index, b.data, b.timeline FROM document_audio a"
+                " JOIN audio_blobs b ON b.audio_hash = a.audio_hash WHERE a.document_id = ?", (document_id,)):
+            if index < len(spans):
+                audio_files[index] = data
+                timelines[index] = WordTimeline.from_bytes(timeline) if timeline else None
+        return {
+            "id": document_id, "timestamp": row[0], "voice": row[1], "rate": row[2], "volume": row[3],
+            "pitch": row[4], "text": text, "spans": spans, "audio_files": audio_files, "timelines": timelines,
+        }
+
+    def _clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM documents")
+            conn.execute("DELETE FROM document_audio")
+            conn.execute("DELETE FROM audio_blobs")
+        conn.execute("PRAGMA incremental_vacuum")
+
+    def _compact(self):
+        """删除超出上限的旧记录和旧音频，回收未引用的音频和空闲页"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM documents WHERE id NOT IN"
+                         " (SELECT id FROM documents ORDER BY id DESC LIMIT ?)", (self.max_documents,))
+            conn.execute("DELETE FROM document_audio WHERE document_id NOT IN"
+                         " (SELECT id FROM documents ORDER BY id DESC LIMIT ?)", (self.max_audio_documents,))
+            removed = conn.execute("DELETE FROM audio_blobs WHERE audio_hash NOT IN"
+                                   " (SELECT audio_hash FROM document_audio)").rowcount
+        conn.execute("PRAGMA incremental_vacuum")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        logger.info(f"历史记录整理完成，清理 {removed} 段音频")
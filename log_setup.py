@@ -0,0 +1,64 @@
+import argparse
+import atexit
+import logging
+import logging.handlers
+import queue
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+_listener = None
+
+
+def setup_logging(level="INFO", log_file="tts_debug.log", max_bytes=1024 * 1024, backup_count=3, console=True):
+    """配置日志：记录先放进内存队列，由后台线程写文件和控制台
+
+    调用方（事件循环、界面回调）只做一次入队，不会被磁盘写入阻塞；
+    日志文件超过 max_bytes 后轮转，最多保留 backup_count 个旧文件。
+    """
+    global _listener
+    stop_logging()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+        handlers.append(stream_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def parse_log_level(argv):
+    """从命令行参数中取出 --log-level，返回 (级别或 None, 其余参数)"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--log-level", type=str.upper, choices=LOG_LEVELS)
+    args, remaining = parser.parse_known_args(argv)
+    return args.log_level, remaining
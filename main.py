@@ -1,30 +1,39 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import pygame
-import edge_tts
-import asyncio
+try:
+    import tkinter as tk
+    from tkinter import ttk, messagebox, filedialog
+except ImportError:
+    # 没有安装 Tk 的服务器（如未装 python3-tk）仍可使用无界面批量模式
+    tk = ttk = messagebox = filedialog = None
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
 import os
-import shutil
-import re
+import sys
+import bisect
 import time
 import logging
 from datetime import datetime
 from config import Config
-import aiohttp
+from audio_cache import AudioCache
+import metrics
+from log_setup import setup_logging, parse_log_level
+from audio_utils import is_in_memory, audio_exists, combine_audio_files, ExportCancelled
+from exporter import AudioExportJob
+from history_store import HistoryStore
+from text_splitter import split_chunk_spans, split_language_spans
+from text_document import MappedTextDocument, guess_encoding
+from voice_catalog import VoiceCatalog
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('tts_debug.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# 输入停顿多久后才重新分割句子（毫秒）
+SPLIT_DEBOUNCE_MS = 300
+UI_LAG_INTERVAL_MS = 100  # 界面事件循环延迟的采样间隔
+LARGE_FILE_BYTES = 1024 * 1024  # 超过此大小的文件用内存映射打开，文本框只显示播放位置附近的窗口
+WINDOW_SENTENCES_BEFORE = 50  # 窗口中当前句之前保留的句子数
+WINDOW_SENTENCES_AFTER = 200  # 窗口中当前句之后显示的句子数
+INDEX_POLL_SECONDS = 0.2  # 转换追上索引进度时的等待间隔
+
 class TTSReader:
     def __init__(self, root):
         self.root = root
@@ -34,28 +43,171 @@ class TTSReader:
         last_settings = self.config.get_last_settings()
         self.voice = last_settings["voice"]
         self.max_workers = last_settings["max_workers"]
+        self.rate = last_settings["rate"]
+        self.volume = last_settings["volume"]
+        self.pitch = last_settings["pitch"]
+        self.stream_playback = last_settings["stream_playback"]  # 边转换边播放
+        self.in_memory_audio = last_settings["in_memory_audio"]  # 音频保存在内存中，不写临时文件
+        self.chunk_settings = self.config.get_chunk_settings()  # 短句合并、长句切分
+        self.language_settings = self.config.get_language_settings()  # 逐句检测语言并按语言选择语音
+        
+        # 语音目录：启动时只读本地缓存，过期后在后台联网刷新
+        catalog_settings = self.config.get_voice_catalog_settings()
+        self.voice_catalog = VoiceCatalog(catalog_settings["cache_path"], catalog_settings["ttl_seconds"]).load()
         
         self.root.title("TTS文本朗读器")
         self.root.geometry("800x600")
         
-        # 初始化pygame音频
-        pygame.mixer.init()
-        
         # 状态变量
         self.sentences = []
+        self.sentence_spans = []  # 每句在文本中的 (起始, 结束) 字符位置
+        self.sentence_starts = []  # 句子起始位置，用于点击时二分查找
+        self.piece_spans = []  # 合并成分块之前的原句位置，高亮和点击按原句进行
+        self.piece_starts = []
+        self.current_piece = None  # 正在高亮的原句；没有词边界时间轴时为 None，高亮整个分块
+        self.sentence_languages = []  # 每句检测出的语言，决定分句规则和使用的语音
         self.audio_files = []  # 存储每句对应的音频文件
         self.current_sentence = 0
         self.is_playing = False
         self.is_paused = False
         self.is_converted = False  # 是否已转换
+        self.is_partial = False  # 转换已结束但有句子失败：已有音频可播放和保存，再次转换只补转失败的句子
         self.is_converting = False  # 是否正在转换
         self.temp_files = []
         self.is_continuous_play = False  # 是否为连续播放模式
-        self.last_text_content = ""  # 记录上次的文本内容
-        self.session = None  # 添加会话复用
+        self.last_text_content = "\n"  # 记录上次分割的文本快照（空文本框内容为换行）
+        self.scheduler = None  # 当前转换任务的优先级调度器
+        self.word_timelines = []  # 与 audio_files 对应的词边界时间轴，没有时为 None
+        self.word_highlight = None  # 当前高亮的词 (文本起始, 结束) 位置
+        self.export_job = None  # 正在进行的后台导出
+        
+        # 大文件模式：文本在内存映射中按块建立索引，文本框只显示一个窗口
+        self.document = None
+        self.document_indexed = False  # 索引是否已全部完成并同步到音频列表
+        self.window = None  # 文本框中显示的句子范围 (起始句, 结束句)
+        self.window_offset = 0  # 文本框第一个字符在文档中的字符偏移
+        self.window_anchor = 0  # 窗口顶部对应的句子
+        
+        # 转换历史：完整文本和句子音频保存在 SQLite 中，读写都在后台线程
+        history_settings = self.config.get_history_settings()
+        self.history = HistoryStore(history_settings["db_path"], history_settings["keep_audio"],
+                                    history_settings["max_documents"], history_settings["max_audio_documents"])
+        
+        # 后台分句：防抖定时器、结果版本号和完成信号
+        self.split_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-split")
+        self.split_after_id = None
+        self.split_generation = 0
+        self.applied_split_generation = 0
+        self.split_ready = threading.Event()
+        self.split_ready.set()
+        
+        # 网络栈（asyncio、aiohttp、edge-tts）、音频缓存索引和 pygame 都在首次用到时才加载，
+        # 窗口先显示出来，之后再在后台预热
+        self.stack_lock = threading.Lock()
+        self.mixer_lock = threading.Lock()
+        self.audio_cache = None
+        self.runtime = None
+        self.synthesizer = None
+        self.player = None
         
         self.setup_ui()
         
+        # 界面显示后再在后台加载网络栈和音频设备，并预热到合成服务的连接
+        self.root.after(500, self.start_background_warm_up)
+        self.sample_ui_lag()
+        
+    def ensure_synthesis(self):
+        """返回常驻事件循环，首次调用时加载网络栈、音频缓存并创建合成器（线程安全）"""
+        with self.stack_lock:
+            if self.runtime is None:
+                from async_runtime import AsyncRuntime
+                from synthesis import SentenceSynthesizer
+                from tts_backends import create_backend
+                
+                start_time = time.perf_counter()
+                cache_settings = self.config.get_cache_settings()
+                if cache_settings["enabled"]:
+                    self.audio_cache = AudioCache(cache_settings["cache_dir"], cache_settings["max_bytes"])
+                
+                # 常驻后台事件循环，所有转换共享同一个循环和连接池
+                runtime = AsyncRuntime().start()
+                backend_settings = self.config.get_backend_settings()
+                backend = create_backend(backend_settings["name"], runtime.communicate_options,
+                                         **backend_settings["fake_options"])
+                self.synthesizer = SentenceSynthesizer(self.audio_cache, backend)
+                self.runtime = runtime
+                logger.info(f"合成组件加载完成，耗时: {(time.perf_counter() - start_time)*1000:.1f}ms")
+            return self.runtime
+    
+    def init_mixer(self):
+        """加载 pygame 并打开音频设备（只执行一次）"""
+        with self.mixer_lock:
+            import pygame
+            if not pygame.mixer.get_init():
+                start_time = time.perf_counter()
+                pygame.mixer.init()
+                logger.info(f"音频设备初始化完成，耗时: {(time.perf_counter() - start_time)*1000:.1f}ms")
+    
+    def ensure_player(self):
+        """返回播放引擎，首次播放时创建（在UI线程调用）"""
+        if self.player is None:
+            self.init_mixer()
+            from playback import PlaybackEngine
+            
+            # 播放引擎：预解码后续句子，句子之间由混音器无缝衔接
+            playback_settings = self.config.get_playback_settings()
+            self.player = PlaybackEngine(
+                self.root,
+                get_audio=lambda i: self.audio_files[i] if i < len(self.audio_files) else None,
+                sentence_count=lambda: len(self.audio_files),
+                can_wait=lambda: self.is_converting,
+                on_start=self.on_playback_start,
+                on_wait=self.on_playback_wait,
+                on_tick=self.on_playback_tick,
+                on_finish=self.on_playback_finished,
+                gap_ms=playback_settings["sentence_gap_ms"],
+                lookahead=playback_settings["decode_lookahead"],
+            )
+        return self.player
+    
+    def start_background_warm_up(self):
+        """窗口显示后在后台线程预热，首次转换和播放时不必再等待加载"""
+        threading.Thread(target=self.warm_up_components, name="tts-warm-up", daemon=True).start()
+    
+    def warm_up_components(self):
+        try:
+            runtime = self.ensure_synthesis()
+            if self.synthesizer.backend.warm_up_connections:
+                runtime.submit(runtime.warm_up(min(self.max_workers, 4)))
+        except Exception as e:
+            logger.warning(f"预热合成组件失败: {e}")
+        try:
+            self.init_mixer()
+        except Exception as e:
+            # 首次播放时会在UI线程再试一次
+            logger.warning(f"预先初始化音频设备失败: {e}")
+        if self.voice_catalog.is_stale():
+            try:
+                self.runtime.run(self.voice_catalog.refresh())
+                self.root.after(0, self.update_voice_filters)
+            except Exception as e:
+                # 离线时继续使用缓存或内置列表
+                logger.warning(f"更新语音目录失败: {e}")
+    
+    def update_voice_filters(self):
+        """按语音目录更新地区、性别和语音下拉列表"""
+        self.locale_combo['values'] = [""] + self.voice_catalog.locales()
+        self.gender_combo['values'] = [""] + self.voice_catalog.genders()
+        voices = self.voice_catalog.filter(self.locale_filter_var.get(), self.gender_filter_var.get())
+        if self.voice not in voices and self.voice not in self.voice_catalog:
+            # 配置中的语音不在目录里时仍然保留
+            voices = [self.voice] + voices
+        self.voice_combo['values'] = voices
+    
+    def on_voice_filter_change(self, event):
+        """地区或性别筛选改变"""
+        self.update_voice_filters()
+    
     def setup_ui(self):
         # 主框架
         main_frame = ttk.Frame(self.root, padding="10")
@@ -65,62 +217,24 @@ class TTSReader:
         control_frame = ttk.Frame(main_frame)
         control_frame.pack(fill=tk.X, pady=(0,10))
         
-        # 语音选择
+        # 语音选择：先按地区和性别筛选
         ttk.Label(control_frame, text="语音:").pack(side=tk.LEFT)
+        self.locale_filter_var = tk.StringVar(value="")
+        self.locale_combo = ttk.Combobox(control_frame, textvariable=self.locale_filter_var, width=7, state="readonly")
+        self.locale_combo.pack(side=tk.LEFT, padx=(5,0))
+        self.locale_combo.bind('<<ComboboxSelected>>', self.on_voice_filter_change)
+        
+        self.gender_filter_var = tk.StringVar(value="")
+        self.gender_combo = ttk.Combobox(control_frame, textvariable=self.gender_filter_var, width=6, state="readonly")
+        self.gender_combo.pack(side=tk.LEFT, padx=(5,0))
+        self.gender_combo.bind('<<ComboboxSelected>>', self.on_voice_filter_change)
+        
         self.voice_var = tk.StringVar(value=self.voice)
-        voice_combo = ttk.Combobox(control_frame, textvariable=self.voice_var, width=30)
-        voice_combo['values'] = [
-            # 中文语音
-            "zh-CN-XiaoxiaoNeural",
-            "zh-CN-YunyeNeural", 
-            "zh-CN-YunjianNeural",
-            "zh-CN-XiaoyiNeural",
-            "zh-CN-YunxiNeural",
-            "zh-CN-XiaochenNeural",
-            "zh-CN-XiaohanNeural",
-            "zh-CN-XiaomengNeural",
-            "zh-CN-XiaomoNeural",
-            "zh-CN-XiaoqiuNeural",
-            "zh-CN-XiaoruiNeural",
-            "zh-CN-XiaoshuangNeural",
-            "zh-CN-XiaoxuanNeural",
-            "zh-CN-XiaoyanNeural",
-            "zh-CN-XiaoyouNeural",
-            "zh-CN-XiaozhenNeural",
-            # 日文语音
-            "ja-JP-NanamiNeural",
-            "ja-JP-KeitaNeural",
-            "ja-JP-AoiNeural",
-            "ja-JP-DaichiNeural",
-            "ja-JP-MayuNeural",
-            "ja-JP-NaokiNeural",
-            "ja-JP-ShioriNeural",
-            # 英文语音
-            "en-US-AriaNeural",
-            "en-US-JennyNeural",
-            "en-US-GuyNeural",
-            "en-US-DavisNeural",
-            "en-US-AmberNeural",
-            "en-US-AnaNeural",
-            "en-US-AndrewNeural",
-            "en-US-EmmaNeural",
-            "en-US-BrianNeural",
-            "en-US-ChristopherNeural",
-            "en-US-ElizabethNeural",
-            "en-US-EricNeural",
-            "en-US-JacobNeural",
-            "en-US-JaneNeural",
-            "en-US-JasonNeural",
-            "en-US-MichelleNeural",
-            "en-US-MonicaNeural",
-            "en-US-NancyNeural",
-            "en-US-RogerNeural",
-            "en-US-SaraNeural",
-            "en-US-SteffanNeural",
-            "en-US-TonyNeural"
-        ]
-        voice_combo.pack(side=tk.LEFT, padx=(5,10))
-        voice_combo.bind('<<ComboboxSelected>>', self.on_voice_change)
+        self.voice_combo = ttk.Combobox(control_frame, textvariable=self.voice_var, width=30)
+        self.voice_combo.pack(side=tk.LEFT, padx=(5,10))
+        self.voice_combo.bind('<<ComboboxSelected>>', self.on_voice_change)
+        self.locale_filter_var.set(self.voice_catalog.locale_for(self.voice))
+        self.update_voice_filters()
         
         # 线程数设置
         ttk.Label(control_frame, text="线程数:").pack(side=tk.LEFT, padx=(10,0))
@@ -135,6 +249,10 @@ class TTSReader:
         clear_history_btn = ttk.Button(control_frame, text="清空历史", command=self.clear_history)
         clear_history_btn.pack(side=tk.LEFT, padx=(5,0))
         
+        # 导出性能指标快照
+        metrics_btn = ttk.Button(control_frame, text="性能指标", command=self.export_metrics)
+        metrics_btn.pack(side=tk.LEFT, padx=(5,0))
+        
         # 第一行按钮
         button_frame1 = ttk.Frame(main_frame)
         button_frame1.pack(fill=tk.X, pady=(0,5))
@@ -142,6 +260,9 @@ class TTSReader:
         # 剪贴板按钮
         ttk.Button(button_frame1, text="读取剪贴板", command=self.read_clipboard).pack(side=tk.LEFT, padx=(0,5))
         
+        # 打开文件按钮
+        ttk.Button(button_frame1, text="打开文件", command=self.open_file).pack(side=tk.LEFT, padx=(0,5))
+        
         # 转换按钮
         self.convert_btn = ttk.Button(button_frame1, text="开始转换", command=self.convert_text)
         self.convert_btn.pack(side=tk.LEFT, padx=(0,5))
@@ -188,17 +309,18 @@ class TTSReader:
         text_container.pack(fill=tk.BOTH, expand=True)
         
         self.text_widget = tk.Text(text_container, wrap=tk.WORD, font=("微软雅黑", 12))
-        scrollbar = ttk.Scrollbar(text_container, orient=tk.VERTICAL, command=self.text_widget.yview)
-        self.text_widget.configure(yscrollcommand=scrollbar.set)
+        self.text_scrollbar = ttk.Scrollbar(text_container, orient=tk.VERTICAL, command=self.text_widget.yview)
+        self.text_widget.configure(yscrollcommand=self.on_text_scroll)
         
         self.text_widget.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # 配置文本高亮标签
         self.text_widget.tag_configure("current", background="yellow", foreground="black")
         self.text_widget.tag_configure("completed", background="lightgreen", foreground="black")
         self.text_widget.tag_configure("converted", background="lightblue", foreground="black")
         self.text_widget.tag_configure("clickable", foreground="blue", underline=True)
+        self.text_widget.tag_configure("word", background="orange", foreground="black")
         
         # 绑定文本点击事件和文本变化事件
         self.text_widget.bind("<Button-1>", self.on_text_click)
@@ -231,79 +353,364 @@ class TTSReader:
             self.pitch_var.set("0Hz")
     
     def on_text_modified(self, event=None):
-        """文本内容被修改时触发"""
+        """文本内容被修改时触发，防抖后在后台分割句子"""
+        if self.document is not None:
+            # 大文件模式下文本框只读，内容变化来自窗口切换
+            self.text_widget.edit_modified(False)
+            return
         if self.text_widget.edit_modified():
             # 重置修改标志
             self.text_widget.edit_modified(False)
             
-            # 获取当前文本内容
-            current_text = self.text_widget.get(1.0, tk.END).strip()
-            
-            # 检查文本是否真的发生了变化
-            if current_text != self.last_text_content:
-                self.last_text_content = current_text
-                self.on_text_content_changed()
+            # 连续输入时只在停顿后分割一次
+            self.split_ready.clear()
+            if self.split_after_id is not None:
+                self.root.after_cancel(self.split_after_id)
+            self.split_after_id = self.root.after(SPLIT_DEBOUNCE_MS, self.request_split)
+    
+    def request_split(self, force=False):
+        """取当前文本快照并提交到后台线程分割，返回该快照"""
+        if self.split_after_id is not None:
+            self.root.after_cancel(self.split_after_id)
+            self.split_after_id = None
+        
+        text = self.text_widget.get(1.0, tk.END)
+        if text == self.last_text_content and not force:
+            # 文本没有变化，之前的分割结果仍然有效
+            if self.split_generation == self.applied_split_generation:
+                self.split_ready.set()
+            return text
+        
+        self.last_text_content = text
+        self.split_generation += 1
+        generation = self.split_generation
+        self.split_ready.clear()
+        
+        # 字符串不可变，后台线程分割的就是这一刻的快照
+        future = self.split_executor.submit(self.split_text, text, self.voice_catalog.language_for(self.voice))
+        future.add_done_callback(lambda f: self.root.after(0, lambda: self.on_split_done(generation, text, f)))
+        return text
+    
+    def split_text(self, text, language):
+        """在后台线程中分割文本，返回 (分块位置列表, 每块的语言列表, 合并前的原句位置列表)"""
+        target_chars, max_chars = self.chunk_settings["target_chars"], self.chunk_settings["max_chars"]
+        pieces = []
+        if self.language_settings["auto_detect"]:
+            spans, languages = split_language_spans(text, language, target_chars, max_chars, pieces)
+            return spans, languages, pieces
+        spans = split_chunk_spans(text, language, target_chars, max_chars, pieces)
+        return spans, [language] * len(spans), pieces
     
-    def on_text_content_changed(self):
+    def on_split_done(self, generation, text, future):
+        """后台分割完成，在UI线程应用结果（过期的结果直接丢弃）"""
+        if generation != self.split_generation:
+            return
+        try:
+            spans, languages, pieces = future.result()
+        except Exception as e:
+            logger.error(f"文本分割失败: {e}", exc_info=True)
+            spans, languages, pieces = [], [], []
+        self.on_text_content_changed(text, spans, languages, pieces)
+        self.applied_split_generation = generation
+        self.split_ready.set()
+    
+    def on_text_content_changed(self, text, spans, languages, pieces):
         """文本内容发生变化时的处理"""
-        # 自动分割句子
-        self.split_sentences()
+        old_sentences = self.sentences
+        old_audio_files = self.audio_files
+        old_languages = self.sentence_languages
+        
+        # 应用新的句子列表
+        self.apply_sentence_spans(text, spans, languages, pieces)
+        
+        # 保留未改动句子的音频，只让新增或修改的句子重新转换
+        if any(old_audio_files):
+            pending = self.reconcile_audio_files(old_sentences, old_audio_files, old_languages)
+            self.is_converted = pending == 0 and bool(self.sentences)
+            self.is_partial = False
+            self.progress_var.set(0 if not self.sentences else (len(self.sentences) - pending) / len(self.sentences) * 100)
+            self.update_button_states()
+            if pending:
+                self.status_label.config(text=f"状态: 文本已更改，需转换 {pending} 句")
+            else:
+                self.status_label.config(text="状态: 文本已更改，音频已全部复用")
+        else:
+            # 没有可复用的音频也换成新的列表，仍在进行的转换据此停止，不会把旧文本的音频写进来
+            self.audio_files = []
+            self.word_timelines = []
+    
+    def reconcile_audio_files(self, old_sentences, old_audio_files, old_languages=()):
+        """按句子内容（和语言）把旧音频映射到新句子列表，返回仍需转换的句子数"""
+        # 同一句子可能出现多次，按内容保存可复用的音频列表；
+        # 没有数字和文字的句子沿用上一句的语言，语言变了就要换语音重新合成
+        reusable = {}
+        old_timelines = self.word_timelines + [None] * (len(old_audio_files) - len(self.word_timelines))
+        old_languages = list(old_languages) + [None] * (len(old_audio_files) - len(old_languages))
+        for sentence, audio_file, timeline, language in zip(old_sentences, old_audio_files, old_timelines,
+                                                            old_languages):
+            if audio_file:
+                reusable.setdefault(sentence, []).append((audio_file, timeline, language))
+        
+        new_audio_files = []
+        new_timelines = []
+        for sentence, language in zip(self.sentences, self.sentence_languages):
+            candidates = reusable.get(sentence) or []
+            # 语言未知（如历史记录载入的音频）时按内容直接复用
+            match = next((i for i, entry in enumerate(candidates) if entry[2] in (None, language)), None)
+            audio_file, timeline, _ = candidates.pop(match) if match is not None else (None, None, None)
+            new_audio_files.append(audio_file)
+            new_timelines.append(timeline)
+        self.audio_files = new_audio_files
+        self.word_timelines = new_timelines
+        
+        # 删除不再使用的音频
+        stale = [f for entries in reusable.values() for f, _, _ in entries]
+        for audio_file in stale:
+            if is_in_memory(audio_file):
+                continue
+            try:
+                if os.path.exists(audio_file):
+                    os.unlink(audio_file)
+            except OSError:
+                pass
+        if stale:
+            stale_set = {f for f in stale if not is_in_memory(f)}
+            self.temp_files = [f for f in self.temp_files if f not in stale_set]
         
-        # 如果已经转换过，重置转换状态
-        if self.is_converted:
-            self.reset_conversion_state()
-            self.status_label.config(text="状态: 文本已更改，需重新转换")
+        pending = sum(1 for f in new_audio_files if not f)
+        logger.info(f"增量更新: 复用 {len(new_audio_files) - pending} 句音频，待转换 {pending} 句，丢弃 {len(stale)} 个旧音频")
+        return pending
     
     def read_clipboard(self):
         """读取剪贴板内容"""
         try:
             clipboard_text = self.root.clipboard_get()
+            self.close_document()
             self.text_widget.delete(1.0, tk.END)
             self.text_widget.insert(1.0, clipboard_text)
-            self.split_sentences()
-            self.reset_conversion_state()
+            self.text_widget.edit_modified(False)
+            self.request_split()
             self.status_label.config(text="状态: 已读取剪贴板")
         except tk.TclError:
             messagebox.showwarning("警告", "剪贴板为空或无法读取")
     
-    def split_sentences(self):
-        """将文本分割为句子"""
+    def open_file(self):
+        """打开文本文件；大文件用内存映射打开，边建立索引边转换"""
+        if self.is_converting:
+            messagebox.showwarning("警告", "正在转换，请稍后再打开文件")
+            return
+        path = filedialog.askopenfilename(
+            title="打开文本文件",
+            filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            encoding = guess_encoding(path)
+            if os.path.getsize(path) >= LARGE_FILE_BYTES:
+                self.open_large_document(path, encoding)
+                return
+            with open(path, "r", encoding=encoding, errors="replace") as f:
+                text = f.read()
+        except (OSError, ValueError) as e:
+            logger.error(f"打开文件失败: {e}", exc_info=True)
+            messagebox.showerror("错误", f"打开文件失败: {str(e)}")
+            return
+        self.close_document()
+        self.text_widget.delete(1.0, tk.END)
+        self.text_widget.insert(1.0, text)
+        self.text_widget.edit_modified(False)
+        self.request_split()
+        self.status_label.config(text=f"状态: 已打开 {os.path.basename(path)}")
+    
+    def open_large_document(self, path, encoding):
+        """以大文件模式打开：后台逐块分割，文本框只显示播放位置附近的句子"""
+        language = self.voice_catalog.language_for(self.voice)
+        document = MappedTextDocument(path, encoding, split=lambda text: self.split_text(text, language))
+        self.stop_play()
+        self.close_document()
+        self.reset_conversion_state()
+        
+        # 文本框不再参与分句；版本号前移，让仍在进行的转换作废
+        if self.split_after_id is not None:
+            self.root.after_cancel(self.split_after_id)
+            self.split_after_id = None
+        self.split_generation += 1
+        self.applied_split_generation = self.split_generation
+        self.split_ready.set()
+        
+        self.document = document
+        self.document_indexed = False
+        self.sentences = document.sentences
+        self.sentence_spans = document.spans
+        self.sentence_starts = document.starts
+        self.piece_spans = document.pieces
+        self.piece_starts = document.piece_starts
+        self.sentence_languages = document.languages
+        self.current_sentence = 0
+        self.text_widget.delete(1.0, tk.END)
+        self.text_widget.config(state=tk.DISABLED)
+        self.text_widget.edit_modified(False)
+        
+        threading.Thread(target=self.index_document, args=(document,), name="tts-index", daemon=True).start()
+        self.status_label.config(text=f"状态: 已打开 {os.path.basename(path)}，正在建立索引...")
+    
+    def index_document(self, document):
+        """后台逐块建立句子索引，每完成一块通知界面线程"""
         start_time = time.time()
-        text = self.text_widget.get(1.0, tk.END).strip()
-        if not text:
-            self.sentences = []
-            self.progress_label.config(text="句子: 0句")
+        try:
+            for count in document.iter_index():
+                if self.document is not document:
+                    return
+                self.root.after(0, lambda c=count: self.on_document_indexed(document, c))
+        except Exception as e:
+            if self.document is document:
+                logger.error(f"建立索引失败: {e}", exc_info=True)
+                self.root.after(0, lambda error=e: messagebox.showerror("错误", f"读取文件失败: {str(error)}"))
             return
-            
-        # 根据当前语音类型选择分割规则
-        if self.voice.startswith("ja-JP"):
-            # 日语分割：句号、问号、感叹号、换行、日语句号
-            sentences = re.split(r'[。！？\n．]+', text)
-        elif self.voice.startswith("en-US"):
-            # 英语分割：句号、问号、感叹号、换行
-            sentences = re.split(r'[.!?\n]+', text)
+        logger.info(f"{document.path} 索引完成，{len(document)} 句，耗时: {time.time() - start_time:.2f}s")
+        self.root.after(0, lambda: self.on_document_indexed(document, len(document), finished=True))
+    
+    def on_document_indexed(self, document, count, finished=False):
+        """新索引出的句子补上音频位置（转换中的任务会接着合成它们），需要时刷新显示窗口"""
+        if document is not self.document:
+            return
+        new_count = count - len(self.audio_files)
+        if new_count > 0:
+            self.word_timelines.extend([None] * new_count)
+            self.audio_files.extend([None] * new_count)
+        if finished:
+            self.document_indexed = True
+            self.progress_label.config(text=f"句子: {count}句")
         else:
-            # 中文分割：句号、问号、感叹号、换行
-            sentences = re.split(r'[。！？\n]+', text)
-            
-        self.sentences = [s.strip() for s in sentences if s.strip()]
+            percent = document.indexed_bytes / document.size * 100 if document.size else 100
+            self.progress_label.config(text=f"句子: {count}句（索引 {percent:.0f}%）")
+        # 首次显示，或窗口还没填满时补上新句子
+        if self.window is None:
+            self.render_document_window(0)
+        elif self.window[1] < min(count, self.window_anchor + WINDOW_SENTENCES_AFTER):
+            self.render_document_window(self.window_anchor)
+    
+    def close_document(self):
+        """退出大文件模式，文本框恢复可编辑"""
+        if self.document is None:
+            return
+        document = self.document
+        self.document = None
+        self.document_indexed = False
+        self.window = None
+        self.window_offset = 0
+        self.window_anchor = 0
+        # 版本号前移，让仍在进行的转换作废；下次分割一定重新执行
+        self.split_generation += 1
+        self.applied_split_generation = self.split_generation
+        self.last_text_content = None
+        self.sentences, self.sentence_spans, self.sentence_starts, self.sentence_languages = [], [], [], []
+        self.piece_spans, self.piece_starts = [], []
+        self.current_piece = None
+        self.text_widget.config(state=tk.NORMAL)
+        document.close()
+    
+    def render_document_window(self, sentence_index):
+        """在文本框中显示以该句为起点的一段文本（之前保留少量句子），并把该句滚动到顶部"""
+        document = self.document
+        count = len(document)
+        if not count:
+            return
+        sentence_index = max(0, min(sentence_index, count - 1))
+        first = max(0, sentence_index - WINDOW_SENTENCES_BEFORE)
+        last = min(count, sentence_index + WINDOW_SENTENCES_AFTER)
+        start = document.starts[first] if first else 0
+        text = document.text(start, document.ends[last - 1])
+        
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.delete(1.0, tk.END)
+        self.text_widget.insert(1.0, text)
+        self.text_widget.config(state=tk.DISABLED)
+        self.text_widget.edit_modified(False)
+        self.window = (first, last)
+        self.window_offset = start
+        self.window_anchor = sentence_index
+        self.word_highlight = None
+        self.text_widget.yview(self.text_index(document.starts[sentence_index]))
+        if self.is_playing and self.sentence_visible(self.current_sentence):
+            self.tag_current_sentence()
+    
+    def on_text_scroll(self, first, last):
+        """滚动条联动；大文件模式下滚动到窗口边缘时换到相邻的一段"""
+        self.text_scrollbar.set(first, last)
+        if self.document is None or self.window is None:
+            return
+        if float(last) >= 1.0 and self.window[1] < len(self.document):
+            # 窗口末尾的句子成为新窗口的顶部
+            self.root.after_idle(lambda anchor=self.window[1] - 1: self.shift_document_window(anchor))
+        elif float(first) <= 0.0 and self.window[0] > 0:
+            self.root.after_idle(lambda anchor=self.window[0]: self.shift_document_window(anchor))
+    
+    def shift_document_window(self, sentence_index):
+        if self.document is not None and sentence_index != self.window_anchor:
+            self.render_document_window(sentence_index)
+    
+    def text_index(self, offset):
+        """文档字符偏移对应的文本框索引"""
+        return f"1.0+{offset - self.window_offset}c"
+    
+    def sentence_visible(self, sentence_index):
+        """句子是否在文本框中（普通模式下总是在）"""
+        if self.document is None:
+            return True
+        return self.window is not None and self.window[0] <= sentence_index < self.window[1]
+    
+    def apply_sentence_spans(self, text, spans, languages, pieces):
+        """应用分割结果，记录每句在文本中的字符位置和语言，以及分块内各原句的位置"""
+        self.sentence_spans = spans
+        self.sentence_languages = languages
+        self.sentence_starts = [start for start, _ in spans]
+        self.piece_spans = pieces
+        self.piece_starts = [start for start, _ in pieces]
+        self.sentences = [text[start:end] for start, end in spans]
         self.current_sentence = 0
+        self.current_piece = None
         
         # 清除所有标签
         self.text_widget.tag_remove("current", 1.0, tk.END)
         self.text_widget.tag_remove("completed", 1.0, tk.END)
         self.text_widget.tag_remove("converted", 1.0, tk.END)
         self.text_widget.tag_remove("clickable", 1.0, tk.END)
+        self.text_widget.tag_remove("word", 1.0, tk.END)
+        self.word_highlight = None
         
         self.progress_label.config(text=f"句子: {len(self.sentences)}句")
-        
-        split_time = time.time() - start_time
-        logger.info(f"文本分割完成，耗时: {split_time*1000:.1f}ms，分割出 {len(self.sentences)} 个句子")
+        logger.info(f"文本分割完成，分割出 {len(self.sentences)} 个句子")
+    
+    def sentence_pieces(self, sentence_index):
+        """分块内各原句的序号范围"""
+        start, end = self.sentence_spans[sentence_index]
+        return range(bisect.bisect_left(self.piece_starts, start), bisect.bisect_left(self.piece_starts, end))
+    
+    def piece_text_range(self, piece_index):
+        """返回原句在文本框中的 (起始, 结束) 索引"""
+        start, end = self.piece_spans[piece_index]
+        return self.text_index(start), self.text_index(end)
+    
+    def tag_sentence(self, tag, sentence_index):
+        """给分块内的每个原句加标签，原句之间的标点和空白不加"""
+        for piece in self.sentence_pieces(sentence_index):
+            self.text_widget.tag_add(tag, *self.piece_text_range(piece))
+    
+    def tag_current_sentence(self):
+        """高亮正在读的原句；没有词边界时间轴无法定位时高亮整个分块"""
+        if self.current_piece is not None:
+            self.text_widget.tag_add("current", *self.piece_text_range(self.current_piece))
+        else:
+            self.tag_sentence("current", self.current_sentence)
     
     def reset_conversion_state(self):
         """重置转换状态"""
         self.is_converted = False
+        self.is_partial = False
         self.audio_files = []
+        self.word_timelines = []
         self.cleanup_temp_files()
         # 重置进度条和进度标签
         self.progress_var.set(0)
@@ -311,20 +718,27 @@ class TTSReader:
         self.update_button_states()
     
     def on_voice_change(self, event):
-        """语音选择改变"""
+        """语音选择改变：已有音频都是旧语音合成的，全部丢弃，转换中途或部分失败时也一样"""
         self.voice = self.voice_var.get()
         self.status_label.config(text=f"状态: 已切换语音 - {self.voice}")
-        if self.is_converted:
-            self.reset_conversion_state()
+        if self.is_converting or any(self.audio_files):
+            self.stop_play()
             self.status_label.config(text="状态: 语音已更改，需重新转换")
+        # 换成新的音频列表，仍在进行的转换据此停止，不会把旧语音的音频写进来
+        self.reset_conversion_state()
+        # 不同语言的分割规则不同，按新语音重新分割
+        if self.document is not None:
+            self.open_large_document(self.document.path, self.document.encoding)
+            return
+        self.request_split(force=True)
     
     def convert_text(self):
         """开始转换文本为音频"""
         start_time = time.time()
         logger.info("=== 开始转换流程 ===")
         
-        # 快速检查
-        if not self.text_widget.get(1.0, tk.END).strip():
+        # 立即提交尚在防抖中的分割，转换线程会等待分割完成；大文件模式下由索引线程提供句子
+        if self.document is None and not self.request_split().strip():
             messagebox.showwarning("警告", "请先输入文本")
             return
         
@@ -350,35 +764,25 @@ class TTSReader:
         logger.info("=== 进入转换线程 ===")
         
         try:
-            # 在线程中进行文本分割，避免阻塞UI
-            ui_start = time.time()
             self.root.after(0, lambda: self.status_label.config(text="状态: 分析文本..."))
-            logger.debug(f"UI状态更新耗时: {(time.time() - ui_start)*1000:.1f}ms")
-            
-            # 确保获取最新的文本内容并分割
-            text_start = time.time()
-            text = self.text_widget.get(1.0, tk.END).strip()
-            logger.info(f"获取文本内容耗时: {(time.time() - text_start)*1000:.1f}ms，文本长度: {len(text)}")
             
-            if not text:
-                self.root.after(0, lambda: messagebox.showwarning("警告", "文本为空"))
-                return
-            
-            # 在主线程中分割句子
+            # 等待后台分割完成，保证使用的是最新文本的句子列表
             split_start = time.time()
-            self.root.after(0, self.split_sentences)
-            
-            # 等待分割完成
-            time.sleep(0.1)
-            logger.info(f"句子分割耗时: {(time.time() - split_start)*1000:.1f}ms，句子数量: {len(self.sentences)}")
+            if not self.split_ready.wait(timeout=60):
+                raise TimeoutError("文本分割超时")
+            document = self.document
+            if document is not None and not document.ready.wait(timeout=60):
+                raise TimeoutError("建立索引超时")
+            logger.info(f"等待句子分割耗时: {(time.time() - split_start)*1000:.1f}ms，句子数量: {len(self.sentences)}")
             
             if not self.sentences:
                 self.root.after(0, lambda: messagebox.showwarning("警告", "无法分割句子"))
                 return
             
             # 显示句子信息
-            for i, sentence in enumerate(self.sentences):
-                logger.debug(f"句子 {i+1}: {sentence[:50]}...")
+            if logger.isEnabledFor(logging.DEBUG) and document is None:
+                for i, sentence in enumerate(self.sentences):
+                    logger.debug(f"句子 {i+1}: {sentence[:50]}...")
             
             self.root.after(0, lambda: self.status_label.config(text="状态: 开始转换..."))
             
@@ -386,155 +790,199 @@ class TTSReader:
             async_start = time.time()
             logger.info("开始异步转换...")
             
-            # 检查网络连接
-            logger.info("检查edge-tts服务连接...")
-            asyncio.run(self.convert_all_sentences_parallel())
+            # 在常驻事件循环中执行，复用已建立的连接
+            self.ensure_synthesis().run(self.convert_all_sentences_parallel())
             logger.info(f"异步转换完成，耗时: {(time.time() - async_start):.2f}s")
             
         except Exception as e:
             logger.error(f"转换过程出错: {str(e)}", exc_info=True)
-            self.root.after(0, lambda: messagebox.showerror("错误", f"转换失败: {str(e)}"))
+            self.root.after(0, lambda error=e: messagebox.showerror("错误", f"转换失败: {str(error)}"))
         finally:
             self.is_converting = False
             self.root.after(0, self.update_button_states)
             logger.info(f"=== 转换流程结束，总耗时: {(time.time() - process_start):.2f}s ===")
     
-    async def get_session(self):
-        """获取或创建aiohttp会话"""
-        if self.session is None or self.session.closed:
-            timeout = aiohttp.ClientTimeout(total=30, connect=10)
-            connector = aiohttp.TCPConnector(
-                limit=20,  # 连接池大小
-                limit_per_host=10,
-                ttl_dns_cache=300,
-                use_dns_cache=True,
-            )
-            self.session = aiohttp.ClientSession(
-                timeout=timeout,
-                connector=connector
-            )
-        return self.session
+    def voice_for_language(self, language):
+        """句子实际使用的语音：与所选语音语言不同时改用该语言配置的语音"""
+        if not self.language_settings["auto_detect"]:
+            return self.voice
+        return self.voice_catalog.voice_for(self.voice, language, self.language_settings["voices"])
     
-    async def convert_single_sentence_optimized(self, sentence, index):
-        """优化的单句转换"""
-        start_time = time.time()
-        logger.info(f"开始转换句子 {index+1}: {sentence[:50]}...")
-        
-        # 创建临时文件
+    async def convert_single_sentence_optimized(self, sentence, index, limiter=None, voice=None):
+        """优化的单句转换，返回 (索引, 音频条目, 是否命中缓存, 词边界时间轴)"""
+        audio_data, cached, timeline = await self.synthesizer.synthesize(
+            sentence, voice or self.voice, self.rate, self.volume, self.pitch, index=index, limiter=limiter)
+        return index, self.store_sentence_audio(audio_data), cached, timeline
+    
+    def store_sentence_audio(self, audio_data):
+        """内存模式直接保留字节，否则写入临时文件并返回路径"""
+        if self.in_memory_audio:
+            return audio_data
         temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        temp_file.close()
-        
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                # 创建Communicate对象
-                communicate_start = time.time()
-                communicate = edge_tts.Communicate(sentence, self.voice)
-                logger.info(f"句子 {index+1} 创建Communicate对象耗时: {(time.time() - communicate_start)*1000:.1f}ms")
-                
-                # 网络请求
-                save_start = time.time()
-                logger.info(f"句子 {index+1} 开始网络请求... (尝试 {attempt+1}/{max_retries})")
-                
-                await communicate.save(temp_file.name)
-                
-                save_time = time.time() - save_start
-                logger.info(f"句子 {index+1} 网络请求+保存完成，耗时: {save_time*1000:.1f}ms")
-                
-                # 检查文件
-                file_size = os.path.getsize(temp_file.name) if os.path.exists(temp_file.name) else 0
-                logger.info(f"句子 {index+1} 生成文件大小: {file_size} bytes")
-                
-                if file_size > 0:
-                    break  # 成功
-                else:
-                    logger.warning(f"句子 {index+1} 生成文件为空，重试...")
-                    
-            except Exception as e:
-                logger.error(f"句子 {index+1} 尝试 {attempt+1} 失败: {str(e)}")
-                if attempt == max_retries - 1:
-                    raise e
-                await asyncio.sleep(1)  # 重试前等待
-        
-        total_time = time.time() - start_time
-        logger.info(f"句子 {index+1} 转换完成，总耗时: {total_time*1000:.1f}ms")
-        
-        return index, temp_file.name
+        with temp_file:
+            temp_file.write(audio_data)
+        return temp_file.name
     
     async def convert_all_sentences_parallel(self):
         """优化的并行转换"""
+        import asyncio
+        from retry_policy import PERMANENT, classify_error
+        from scheduler import SynthesisScheduler, AdaptiveConcurrency
+        
         total_start = time.time()
-        total_sentences = len(self.sentences)
+        # 固定本次转换使用的句子列表；文本再次修改后剩余任务作废，由增量更新接管
+        sentences = self.sentences
+        languages = self.sentence_languages
+        generation = self.applied_split_generation
+        # 大文件模式下句子仍在索引，音频列表由界面线程随索引进度补齐，转换随后跟上
+        document = self.document
+        total_sentences = len(self.audio_files) if document is not None else len(sentences)
         logger.info(f"开始并行转换 {total_sentences} 个句子")
         
-        self.audio_files = [None] * total_sentences
-        self.temp_files = []
-        
-        # 使用界面上设置的线程数
+        # 每句按检测出的语言选择语音，不同语音的句子在同一个并发窗口中一起合成
+        voice_by_language = {}
+        
+        def voice_for(index):
+            language = languages[index] if index < len(languages) else None
+            voice = voice_by_language.get(language)
+            if voice is None:
+                voice = voice_by_language[language] = self.voice_for_language(language)
+            return voice
+        
+        # 文本编辑后保留的音频直接复用，只转换缺失的句子
+        if document is None and len(self.audio_files) != total_sentences:
+            self.audio_files = [None] * total_sentences
+        if document is None and len(self.word_timelines) != total_sentences:
+            self.word_timelines = [None] * total_sentences
+        audio_files = self.audio_files
+        word_timelines = self.word_timelines
+        pending_indices = [i for i, audio_file in enumerate(audio_files) if not audio_file]
+        completed = total_sentences - len(pending_indices)
+        logger.info(f"需要转换 {len(pending_indices)} 个句子，复用 {completed} 个")
+        
+        # 界面上设置的线程数只作为并发上限，实际并发由AIMD窗口根据延迟和错误率调整
         max_workers = int(self.thread_var.get())
-        logger.info(f"使用 {max_workers} 个并发线程")
-        
-        # 创建任务
-        tasks = []
-        for i, sentence in enumerate(self.sentences):
-            task = self.convert_single_sentence_optimized(sentence, i)
-            tasks.append(task)
-        
-        # 使用信号量控制并发
-        semaphore = asyncio.Semaphore(max_workers)
-        
-        async def limited_convert(task):
-            async with semaphore:
-                return await task
-        
-        # 批量执行，添加延迟
-        completed = 0
-        batch_size = max(2, max_workers // 2)  # 根据线程数调整批次大小
-        
-        for i in range(0, len(tasks), batch_size):
-            batch = tasks[i:i+batch_size]
-            logger.info(f"开始执行批次 {i//batch_size + 1}，包含 {len(batch)} 个任务")
-            
-            # 执行当前批次
-            batch_results = await asyncio.gather(
-                *[limited_convert(task) for task in batch],
-                return_exceptions=True
-            )
-            
-            # 处理结果
-            for result in batch_results:
-                if isinstance(result, Exception):
-                    logger.error(f"批次任务失败: {result}")
+        limiter = AdaptiveConcurrency(max_workers)
+        logger.info(f"并发上限 {max_workers}，初始窗口 {int(limiter.limit)}")
+        
+        # 按播放位置排序的优先级队列，点击或播放到哪里就优先合成哪里
+        anchor = self.current_sentence if self.is_playing else 0
+        scheduler = SynthesisScheduler(pending_indices, anchor)
+        self.scheduler = scheduler
+        
+        failed = {}  # 句子索引 -> 错误类型
+        scheduled = total_sentences  # 已加入调度的句子数（大文件模式下随索引增长）
+        
+        def schedule_indexed():
+            """把索引线程新分割出的句子加入调度，返回是否有新句子"""
+            nonlocal scheduled
+            if len(audio_files) <= scheduled:
+                return False
+            scheduler.add(range(scheduled, len(audio_files)))
+            scheduled = len(audio_files)
+            return True
+        
+        async def worker():
+            nonlocal completed
+            while True:
+                # 先占用窗口再取任务，保证取出的总是此刻优先级最高的句子
+                await limiter.acquire()
+                # 文本修改或语音切换后剩余任务作废
+                current = self.applied_split_generation == generation and self.audio_files is audio_files
+                if current and document is not None:
+                    schedule_indexed()
+                index = scheduler.next() if current else None
+                if index is None:
+                    await limiter.release()
+                    if current and document is not None and self.document is document:
+                        # 先读完成标志再检查新句子，标志之前补上的句子不会漏掉
+                        indexed = self.document_indexed
+                        if schedule_indexed():
+                            continue
+                        if not indexed:
+                            await asyncio.sleep(INDEX_POLL_SECONDS)
+                            continue
+                    return
+                sentence = sentences[index]
+                request_start = time.monotonic()
+                try:
+                    _, audio, cached, timeline = await self.convert_single_sentence_optimized(
+                        sentence, index, limiter, voice_for(index))
+                except Exception as e:
+                    failed[index] = classify_error(e)
+                    logger.error(f"句子 {index+1} 转换失败（{failed[index]}）: {e}")
+                    await limiter.release(ok=False)
                     continue
-                    
-                index, temp_file_path = result
-                self.audio_files[index] = temp_file_path
-                self.temp_files.append(temp_file_path)
+                latency = None if cached else time.monotonic() - request_start
+                await limiter.release(latency, size=len(sentence))
+                
+                # 合成期间文本可能已修改或语音已切换，旧句子的音频不能写进新的列表
+                if self.applied_split_generation != generation or self.audio_files is not audio_files:
+                    if not is_in_memory(audio):
+                        self.temp_files.append(audio)
+                    continue
+                
+                # 先放时间轴再放音频，播放引擎看到音频时时间轴已就绪
+                word_timelines[index] = timeline
+                audio_files[index] = audio
+                if not is_in_memory(audio):
+                    self.temp_files.append(audio)
                 completed += 1
                 
-                logger.info(f"句子 {index+1} 任务完成，进度: {completed}/{total_sentences}")
+                # 第一句就绪后即可开始边转换边播放
+                if index == 0 and self.stream_playback:
+                    self.root.after(0, self.update_button_states)
+                
+                total = len(audio_files)
+                logger.debug(f"句子 {index+1} 任务完成，进度: {completed}/{total}")
                 
                 # 更新UI
-                self.root.after(0, lambda c=completed: self.status_label.config(text=f"状态: 转换中... ({c}/{total_sentences})"))
-                self.root.after(0, lambda c=completed: self.progress_var.set((c/total_sentences)*100))
-            
-            # 批次间延迟，避免请求过于密集
-            if i + batch_size < len(tasks):
-                await asyncio.sleep(0.3)
-        
-        # 清理会话
-        if self.session and not self.session.closed:
-            await self.session.close()
-            self.session = None
+                self.root.after(0, lambda c=completed, t=total: self.status_label.config(text=f"状态: 转换中... ({c}/{t})"))
+                self.root.after(0, lambda c=completed, t=total: self.progress_var.set((c/t)*100))
+        
+        # 滑动窗口：任何一句完成都立即补上下一句，不再按批次等待
+        worker_count = max_workers if document is not None else min(max_workers, len(pending_indices))
+        await asyncio.gather(*[worker() for _ in range(worker_count)])
+        total_sentences = len(audio_files)
+        if len(voice_by_language) > 1:
+            logger.info(f"多语言文本，语音分配: {voice_by_language}")
+        
+        # 最终重试：限流或网络抖动导致失败的句子再补转一轮，只重转失败的句子
+        retry_indices = [i for i, kind in failed.items() if kind != PERMANENT]
+        if retry_indices and self.applied_split_generation == generation and self.audio_files is audio_files:
+            logger.info(f"最终重试 {len(retry_indices)} 个失败的句子")
+            self.root.after(0, lambda: self.status_label.config(text=f"状态: 重试 {len(retry_indices)} 个失败的句子..."))
+            for index in retry_indices:
+                del failed[index]
+                scheduler.add([index])
+            await asyncio.gather(*[worker() for _ in range(min(max_workers, len(retry_indices)))])
+        logger.info(f"并发窗口最终大小: {limiter.limit:.1f}")
+        
+        # 为下一次转换补充预热连接（离线模拟后端不联网）
+        if self.synthesizer.backend.warm_up_connections:
+            asyncio.ensure_future(self.runtime.warm_up(min(int(limiter.limit), 4)))
+        self.scheduler = None
         
         convert_time = time.time() - total_start
         logger.info(f"所有句子转换完成，耗时: {convert_time:.2f}s，平均每句: {(convert_time/total_sentences)*1000:.1f}ms")
         
         # 转换完成
-        if self.is_converting:
+        if self.audio_files is not audio_files:
+            logger.info("转换期间语音已更改，本次音频已丢弃")
+        elif self.applied_split_generation != generation:
+            logger.info("转换期间文本已修改，剩余句子需重新转换")
+        elif failed:
+            # 失败的句子保持为空，播放时跳过，再次点击转换只补转这些句子
+            logger.error(f"{len(failed)} 个句子转换失败: {sorted(i + 1 for i in failed)}")
+            self.is_partial = any(audio_files)
+            self.root.after(0, lambda: self.status_label.config(
+                text=f"状态: {len(failed)} 句转换失败，可再次点击转换重试"))
+        elif self.is_converting:
             self.is_converted = True
-            self.root.after(0, lambda: self.status_label.config(text=f"状态: 转换完成"))
+            self.is_partial = False
+            self.root.after(0, lambda: self.status_label.config(text="状态: 转换完成"))
             self.root.after(0, lambda: self.progress_var.set(100))
+            self.root.after(0, lambda: self.record_history(generation))
             
             total_time = time.time() - total_start
             logger.info(f"=== 并行转换完成，总耗时: {total_time:.2f}s ===")
@@ -543,7 +991,7 @@ class TTSReader:
         """保存音频文件"""
         logger.info(f"保存按钮被点击 - is_converted: {self.is_converted}, audio_files数量: {len(self.audio_files)}")
         
-        if not self.is_converted:
+        if not self.is_conversion_usable():
             logger.warning("保存失败：未转换状态")
             messagebox.showwarning("警告", "请先转换文本")
             return
@@ -556,11 +1004,10 @@ class TTSReader:
         # 检查音频文件是否存在
         valid_files = []
         for i, audio_file in enumerate(self.audio_files):
-            if audio_file and os.path.exists(audio_file):
+            if audio_exists(audio_file):
                 valid_files.append(audio_file)
-                logger.debug(f"音频文件 {i+1} 存在: {audio_file}")
             else:
-                logger.warning(f"音频文件 {i+1} 不存在或为空: {audio_file}")
+                logger.warning(f"音频文件 {i+1} 不存在或为空")
         
         if not valid_files:
             logger.error("保存失败：没有有效的音频文件")
@@ -569,6 +1016,10 @@ class TTSReader:
         
         logger.info(f"找到 {len(valid_files)} 个有效音频文件，开始保存...")
         
+        missing = len(self.audio_files) - len(valid_files)
+        if missing and not messagebox.askyesno("保存音频", f"有 {missing} 句尚未转换成功，是否只保存已转换的部分？"):
+            return
+        
         # 生成默认文件名
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         default_filename = f"{timestamp}.mp3"
@@ -585,119 +1036,85 @@ class TTSReader:
             logger.info("用户取消了保存操作")
             return
         
-        try:
-            logger.info(f"开始合并音频到: {save_path}")
-            # 合并所有音频为一个文件
-            self.combine_audio_files(save_path)
-            
-            # 询问是否保存单句音频
-            if messagebox.askyesno("保存选项", "是否同时保存单句音频文件？"):
-                save_dir = os.path.dirname(save_path)
-                base_name = os.path.splitext(os.path.basename(save_path))[0]
-                
-                # 保存单个句子音频
-                saved_count = 0
-                for i, (sentence, audio_file) in enumerate(zip(self.sentences, self.audio_files)):
-                    if audio_file and os.path.exists(audio_file):
-                        safe_sentence = re.sub(r'[^\w\s-]', '', sentence[:20])  # 取前20个字符
-                        safe_sentence = re.sub(r'[-\s]+', '_', safe_sentence)
-                        filename = f"{base_name}_第{i+1:03d}句_{safe_sentence}.mp3"
-                        single_save_path = os.path.join(save_dir, filename)
-                        shutil.copy2(audio_file, single_save_path)
-                        saved_count += 1
-                        logger.debug(f"保存单句音频: {single_save_path}")
-                
-                logger.info(f"保存完成 - 主文件: {save_path}, 单句文件: {saved_count}个")
-                messagebox.showinfo("成功", f"音频已保存:\n主文件: {save_path}\n单句文件: {saved_count}个")
+        # 先问清楚导出内容，之后的写入全部在后台完成
+        save_sentences = messagebox.askyesno("保存选项", "是否同时保存单句音频文件？")
+        
+        logger.info(f"开始后台导出到: {save_path}")
+        self.status_label.config(text="状态: 正在保存音频...")
+        self.export_job = AudioExportJob(
+            self.audio_files, self.sentences, save_path, save_sentences,
+            on_progress=lambda done, total: self.root.after(
+                0, lambda: self.status_label.config(text=f"状态: 正在保存音频... ({done}/{total})")),
+            on_done=lambda result, error: self.root.after(0, lambda: self.on_export_done(result, error)),
+        ).start()
+        self.update_button_states()
+    
+    def cancel_export(self):
+        """取消正在进行的导出"""
+        if self.export_job is not None:
+            self.export_job.cancel()
+            self.status_label.config(text="状态: 正在取消保存...")
+    
+    def on_export_done(self, result, error):
+        """后台导出结束"""
+        self.export_job = None
+        self.update_button_states()
+        if isinstance(error, ExportCancelled):
+            self.status_label.config(text="状态: 已取消保存")
+        elif error is not None:
+            self.status_label.config(text="状态: 保存失败")
+            messagebox.showerror("错误", f"保存失败: {str(error)}")
+        else:
+            self.status_label.config(text="状态: 保存完成")
+            if result["sentence_files"]:
+                messagebox.showinfo("成功", f"音频已保存:\n主文件: {result['save_path']}\n单句文件: {result['sentence_files']}个")
             else:
-                logger.info(f"保存完成 - 仅主文件: {save_path}")
-                messagebox.showinfo("成功", f"音频已保存: {save_path}")
-            
-        except Exception as e:
-            logger.error(f"保存失败: {str(e)}", exc_info=True)
-            messagebox.showerror("错误", f"保存失败: {str(e)}")
+                messagebox.showinfo("成功", f"音频已保存: {result['save_path']}")
     
     def combine_audio_files(self, output_path):
-        """合并音频文件 - 使用更高效的方法"""
-        try:
-            # 简单的二进制拼接（适用于相同格式的MP3文件）
-            with open(output_path, 'wb') as outfile:
-                for i, audio_file in enumerate(self.audio_files):
-                    if os.path.exists(audio_file):
-                        with open(audio_file, 'rb') as infile:
-                            # 跳过第一个文件之外的MP3头部信息（简化处理）
-                            if i == 0:
-                                outfile.write(infile.read())
-                            else:
-                                # 跳过MP3头部，只写入音频数据部分
-                                content = infile.read()
-                                # 简单处理：直接拼接（可能有轻微的播放间隙）
-                                outfile.write(content)
-        except Exception as e:
-            # 如果合并失败，至少保存第一个文件
-            if self.audio_files and os.path.exists(self.audio_files[0]):
-                shutil.copy2(self.audio_files[0], output_path)
-            else:
-                raise e
+        """合并音频文件"""
+        combine_audio_files(self.audio_files, output_path)
     
     def mark_sentence_converted(self, sentence_index):
         """标记句子为已转换"""
-        if sentence_index < len(self.sentences):
-            text = self.text_widget.get(1.0, tk.END)
-            start_pos = 0
-            
-            for i in range(sentence_index):
-                start_pos = text.find(self.sentences[i], start_pos) + len(self.sentences[i])
-            
-            sentence_start = text.find(self.sentences[sentence_index], start_pos)
-            if sentence_start != -1:
-                sentence_end = sentence_start + len(self.sentences[sentence_index])
-                start_index = f"1.0+{sentence_start}c"
-                end_index = f"1.0+{sentence_end}c"
-                self.text_widget.tag_add("converted", start_index, end_index)
+        if sentence_index < len(self.sentence_spans) and self.sentence_visible(sentence_index):
+            self.tag_sentence("converted", sentence_index)
     
     def make_sentences_clickable(self):
         """使所有句子可点击"""
-        text = self.text_widget.get(1.0, tk.END)
-        start_pos = 0
-        
-        for i, sentence in enumerate(self.sentences):
-            sentence_start = text.find(sentence, start_pos)
-            if sentence_start != -1:
-                sentence_end = sentence_start + len(sentence)
-                start_index = f"1.0+{sentence_start}c"
-                end_index = f"1.0+{sentence_end}c"
-                self.text_widget.tag_add("clickable", start_index, end_index)
-                start_pos = sentence_end
+        first, last = self.window or (0, len(self.sentence_spans))
+        for i in range(first, last):
+            self.tag_sentence("clickable", i)
     
     def on_text_click(self, event):
         """点击文本播放对应句子"""
-        if not self.is_converted or not self.sentences:
+        if not self.sentences or not (self.is_conversion_usable() or (self.is_converting and self.stream_playback)):
             return
         
-        # 获取点击位置
-        index = self.text_widget.index(tk.CURRENT)
-        clicked_text = self.text_widget.get(1.0, index)
-        
-        # 计算点击位置对应的句子
-        char_count = 0
-        for i, sentence in enumerate(self.sentences):
-            char_count += len(sentence)
-            if char_count >= len(clicked_text):
-                # 播放单句（会自动重置状态）
-                self.play_single_sentence(i)
-                break
+        # 获取点击位置对应的字符偏移
+        offset = self.text_widget.count(1.0, tk.CURRENT, "chars")
+        offset = (offset[0] if offset else 0) + self.window_offset
+        
+        # 先二分查找点击所在的原句，再由原句的起始位置找到它所在的分块
+        piece = bisect.bisect_right(self.piece_starts, offset) - 1
+        if piece >= 0:
+            offset = self.piece_starts[piece]
+        sentence_index = max(0, bisect.bisect_right(self.sentence_starts, offset) - 1)
+        # 播放单句（会自动重置状态）
+        self.play_single_sentence(sentence_index)
     
     def on_text_hover(self, event):
         """鼠标悬停时改变光标"""
-        if self.is_converted:
+        if self.is_conversion_usable():
             self.text_widget.config(cursor="hand2")
         else:
             self.text_widget.config(cursor="xterm")
     
     def play_single_sentence(self, sentence_index):
         """播放单个句子"""
-        if not self.is_converted or sentence_index >= len(self.audio_files):
+        if sentence_index >= len(self.audio_files):
+            return
+        if not self.is_conversion_usable() and not (self.is_converting and self.stream_playback):
             return
         
         # 重置状态
@@ -706,153 +1123,137 @@ class TTSReader:
         self.is_playing = True
         self.is_paused = False
         self.is_continuous_play = False  # 标记为单句播放模式
+        self.set_synthesis_anchor(sentence_index)
         
         # 清除所有标记
         self.text_widget.tag_remove("current", 1.0, tk.END)
         self.text_widget.tag_remove("completed", 1.0, tk.END)
         
-        # 高亮当前句子
-        self.highlight_current_sentence()
-        
-        # 播放音频
-        pygame.mixer.music.load(self.audio_files[self.current_sentence])
-        pygame.mixer.music.play()
-        
+        self.ensure_player().play(sentence_index, continuous=False)
         self.update_button_states()
-        self.status_label.config(text=f"状态: 播放第{self.current_sentence+1}句")
-        
-        # 监控播放完成但不自动播放下一句
-        self.monitor_single_play()
-    
-    def monitor_single_play(self):
-        """监控单句播放完成"""
-        if pygame.mixer.music.get_busy() and self.is_playing and not self.is_paused:
-            # 还在播放，继续监控
-            self.root.after(100, self.monitor_single_play)
-        elif self.is_playing and not self.is_paused:
-            # 单句播放完成，重置状态
-            self.is_playing = False
-            self.text_widget.tag_remove("current", 1.0, tk.END)
-            self.update_button_states()
-            self.status_label.config(text="状态: 播放完成")
     
     def play_from_sentence(self, sentence_index):
         """从指定句子开始连续播放"""
-        if not self.is_converted or sentence_index >= len(self.audio_files):
+        if not self.can_play() or sentence_index >= len(self.audio_files):
             return
             
         self.stop_play()  # 停止当前播放
         self.current_sentence = sentence_index
         self.is_playing = True
-        self.play_current_and_continue()
-        
-    def play_all(self):
-        """从第一句开始连续播放"""
-        if not self.is_converted:
-            return
-        
-        # 重置状态
-        self.stop_play()
-        self.current_sentence = 0
-        self.is_playing = True
         self.is_paused = False
         self.is_continuous_play = True  # 标记为连续播放模式
         
-        # 清除所有标记
-        self.text_widget.tag_remove("current", 1.0, tk.END)
-        self.text_widget.tag_remove("completed", 1.0, tk.END)
+        self.ensure_player().play(sentence_index, continuous=True)
+        self.update_button_states()
         
-        self.play_current_and_continue()
+    def play_all(self):
+        """从第一句开始连续播放"""
+        self.play_from_sentence(0)
     
-    def play_current_and_continue(self):
-        """播放当前句子并继续下一句"""
-        if not self.is_playing or self.current_sentence >= len(self.sentences):
-            # 播放完成，重置状态
-            self.is_playing = False
-            self.is_paused = False
-            self.is_continuous_play = False
-            self.text_widget.tag_remove("current", 1.0, tk.END)
-            self.update_button_states()
-            self.status_label.config(text="状态: 播放完成")
-            return
-        
-        if self.is_paused:
-            # 从暂停状态恢复
-            pygame.mixer.music.unpause()
-            self.is_paused = False
-            self.status_label.config(text="状态: 继续播放")
-            self.update_button_states()
-            return
-        
-        # 高亮当前句子
+    def on_playback_start(self, sentence_index):
+        """播放引擎开始播放某句（连续播放时由混音器无缝切换到下一句）"""
+        if self.is_continuous_play and sentence_index != self.current_sentence:
+            self.mark_sentence_completed()
+        self.current_sentence = sentence_index
+        self.set_synthesis_anchor(sentence_index)
         self.highlight_current_sentence()
-        
-        # 播放音频
-        pygame.mixer.music.load(self.audio_files[self.current_sentence])
-        pygame.mixer.music.play()
-        
-        self.update_button_states()
-        self.status_label.config(text=f"状态: 播放第{self.current_sentence+1}句")
-        
-        # 监控播放完成并自动播放下一句
-        self.monitor_and_continue()
-    
-    def monitor_and_continue(self):
-        """监控播放完成并自动播放下一句"""
-        if pygame.mixer.music.get_busy() and self.is_playing and not self.is_paused:
-            # 还在播放，继续监控
-            self.root.after(100, self.monitor_and_continue)
-        elif self.is_playing and not self.is_paused:
-            # 播放完成，标记当前句子并播放下一句
+        self.status_label.config(text=f"状态: 播放第{sentence_index+1}句")
+    
+    def on_playback_wait(self, sentence_index):
+        """当前句子尚未转换完成，等待中"""
+        if self.is_continuous_play and sentence_index != self.current_sentence:
             self.mark_sentence_completed()
-            self.current_sentence += 1
-            # 稍微延迟后播放下一句
-            self.root.after(300, self.play_current_and_continue)
+        self.current_sentence = sentence_index
+        self.set_synthesis_anchor(sentence_index)
+        self.highlight_current_sentence()
+        self.status_label.config(text=f"状态: 等待第{sentence_index+1}句转换...")
+    
+    def on_playback_finished(self):
+        """播放完成，重置状态"""
+        if self.is_continuous_play:
+            self.mark_sentence_completed()
+        self.is_playing = False
+        self.is_paused = False
+        self.is_continuous_play = False
+        self.current_piece = None
+        self.text_widget.tag_remove("current", 1.0, tk.END)
+        self.clear_word_highlight()
+        self.update_button_states()
+        self.status_label.config(text="状态: 播放完成")
     
     def highlight_current_sentence(self):
         """高亮当前句子"""
-        if not self.sentences or self.current_sentence >= len(self.sentences):
+        if not self.sentences or self.current_sentence >= len(self.sentence_spans):
             return
             
         # 清除当前高亮
         self.text_widget.tag_remove("current", 1.0, tk.END)
-        
-        # 计算当前句子在文本中的位置
-        text = self.text_widget.get(1.0, tk.END)
-        start_pos = 0
-        
-        for i in range(self.current_sentence):
-            start_pos = text.find(self.sentences[i], start_pos) + len(self.sentences[i])
-        
-        sentence_start = text.find(self.sentences[self.current_sentence], start_pos)
-        if sentence_start != -1:
-            sentence_end = sentence_start + len(self.sentences[self.current_sentence])
-            start_index = f"1.0+{sentence_start}c"
-            end_index = f"1.0+{sentence_end}c"
-            
-            self.text_widget.tag_add("current", start_index, end_index)
-            self.text_widget.see(start_index)
+        self.clear_word_highlight()
+        
+        # 大文件模式下播放位置离开窗口时换到新位置
+        if not self.sentence_visible(self.current_sentence):
+            self.render_document_window(self.current_sentence)
+        
+        # 有词边界时间轴时从分块的第一句开始逐句高亮，随播放进度前移
+        pieces = self.sentence_pieces(self.current_sentence)
+        timeline = (self.word_timelines[self.current_sentence]
+                    if self.current_sentence < len(self.word_timelines) else None)
+        self.current_piece = pieces[0] if timeline and pieces else None
+        self.tag_current_sentence()
+        self.text_widget.see(self.text_index(self.sentence_spans[self.current_sentence][0]))
+    
+    def on_playback_tick(self, sentence_index, position):
+        """按播放时钟二分查找当前词并移动词高亮，只改动前后两个词的范围"""
+        timeline = self.word_timelines[sentence_index] if sentence_index < len(self.word_timelines) else None
+        if (not timeline or position is None or sentence_index >= len(self.sentence_spans)
+                or not self.sentence_visible(sentence_index)):
+            self.clear_word_highlight()
+            return
+        span = timeline.locate(position)
+        if span is None:
+            self.clear_word_highlight()
+            return
+        base = self.sentence_spans[sentence_index][0]
+        word = (base + span[0], base + span[1])
+        self.advance_current_piece(word[0])
+        if word == self.word_highlight:
+            return
+        self.clear_word_highlight()
+        self.text_widget.tag_add("word", self.text_index(word[0]), self.text_index(word[1]))
+        self.word_highlight = word
+    
+    def advance_current_piece(self, offset):
+        """读到分块中的下一句时移动句子高亮，连续播放时把读过的原句标为已完成"""
+        if self.current_piece is None:
+            return
+        piece = bisect.bisect_right(self.piece_starts, offset) - 1
+        if piece <= self.current_piece:
+            return
+        for done in range(self.current_piece, piece):
+            done_range = self.piece_text_range(done)
+            self.text_widget.tag_remove("current", *done_range)
+            if self.is_continuous_play:
+                self.text_widget.tag_add("completed", *done_range)
+        self.current_piece = piece
+        self.text_widget.tag_add("current", *self.piece_text_range(piece))
+    
+    def clear_word_highlight(self):
+        """清除词高亮"""
+        if self.word_highlight is not None:
+            start, end = self.word_highlight
+            self.text_widget.tag_remove("word", self.text_index(start), self.text_index(end))
+            self.word_highlight = None
     
     def mark_sentence_completed(self):
         """标记句子为已完成"""
-        if self.current_sentence < len(self.sentences):
-            text = self.text_widget.get(1.0, tk.END)
-            start_pos = 0
-            
-            for i in range(self.current_sentence):
-                start_pos = text.find(self.sentences[i], start_pos) + len(self.sentences[i])
-            
-            sentence_start = text.find(self.sentences[self.current_sentence], start_pos)
-            if sentence_start != -1:
-                sentence_end = sentence_start + len(self.sentences[self.current_sentence])
-                start_index = f"1.0+{sentence_start}c"
-                end_index = f"1.0+{sentence_end}c"
-                self.text_widget.tag_add("completed", start_index, end_index)
+        if self.current_sentence < len(self.sentence_spans) and self.sentence_visible(self.current_sentence):
+            self.tag_sentence("completed", self.current_sentence)
     
     def pause_play(self):
         """暂停播放"""
         if self.is_playing and not self.is_paused:
-            pygame.mixer.music.pause()
+            if self.player is not None:
+                self.player.pause()
             self.is_paused = True
             self.update_button_states()
             self.status_label.config(text="状态: 已暂停")
@@ -862,29 +1263,60 @@ class TTSReader:
         self.is_playing = False
         self.is_paused = False
         self.is_continuous_play = False
-        pygame.mixer.music.stop()
+        self.current_piece = None
+        if self.player is not None:
+            self.player.stop()
         
         # 清除所有高亮标记
         self.text_widget.tag_remove("current", 1.0, tk.END)
         self.text_widget.tag_remove("completed", 1.0, tk.END)
+        self.clear_word_highlight()
         
         self.update_button_states()
         self.status_label.config(text="状态: 已停止")
     
+    def set_synthesis_anchor(self, sentence_index):
+        """通知调度器优先合成该句及其后的句子"""
+        scheduler = self.scheduler
+        if scheduler is not None:
+            scheduler.set_anchor(sentence_index)
+    
+    def is_audio_ready(self, sentence_index):
+        """判断指定句子的音频是否已生成"""
+        return sentence_index < len(self.audio_files) and bool(self.audio_files[sentence_index])
+    
+    def is_conversion_usable(self):
+        """转换已结束且有可用的音频（全部完成，或部分句子失败）"""
+        return self.is_converted or self.is_partial
+    
+    def can_play(self):
+        """是否可以开始播放：转换已结束（失败的句子播放时跳过），或流式模式下第一句已就绪"""
+        if self.is_conversion_usable():
+            return True
+        return self.is_converting and self.stream_playback and self.is_audio_ready(0)
+    
     def update_button_states(self):
         """更新按钮状态"""
         if self.is_converting:
-            # 转换中：禁用所有按钮
+            # 转换中：禁用转换和保存
             self.convert_btn.config(state="disabled")
             self.save_btn.config(state="disabled")
-            self.play_btn.config(state="disabled")
-            self.pause_btn.config(state="disabled")
-            self.stop_btn.config(state="disabled")
-        elif self.is_converted:
-            # 已转换完成
+        elif self.is_conversion_usable():
+            # 已转换完成（或部分失败，可再次转换补转）
             self.convert_btn.config(state="normal")
             self.save_btn.config(state="normal")
-            
+        else:
+            # 未转换：只启用转换按钮
+            self.convert_btn.config(state="normal")
+            self.save_btn.config(state="disabled")
+        
+        if self.export_job is not None:
+            # 导出中：保存按钮变为取消
+            self.save_btn.config(text="取消保存", state="normal", command=self.cancel_export)
+        else:
+            self.save_btn.config(text="保存音频", command=self.save_audio)
+        
+        if self.can_play():
             if self.is_playing:
                 if self.is_paused:
                     # 暂停状态：显示继续按钮
@@ -902,9 +1334,6 @@ class TTSReader:
                 self.pause_btn.config(state="disabled")
                 self.stop_btn.config(state="disabled")
         else:
-            # 未转换：只启用转换按钮
-            self.convert_btn.config(state="normal")
-            self.save_btn.config(state="disabled")
             self.play_btn.config(state="disabled")
             self.pause_btn.config(state="disabled")
             self.stop_btn.config(state="disabled")
@@ -913,15 +1342,10 @@ class TTSReader:
         """恢复播放"""
         if self.is_paused:
             self.is_paused = False
-            if self.is_continuous_play:
-                # 连续播放模式：继续播放当前句子
-                self.play_current_and_continue()
-            else:
-                # 单句播放模式：继续播放当前句子
-                pygame.mixer.music.unpause()
-                self.update_button_states()
-                self.status_label.config(text=f"状态: 继续播放第{self.current_sentence+1}句")
-                self.monitor_single_play()
+            if self.player is not None:
+                self.player.resume()
+            self.update_button_states()
+            self.status_label.config(text=f"状态: 继续播放第{self.current_sentence+1}句")
     
     def cleanup_temp_files(self):
         """清理临时文件"""
@@ -933,13 +1357,62 @@ class TTSReader:
                 pass
         self.temp_files.clear()
     
+    def sample_ui_lag(self, expected=None):
+        """定时器实际触发时间与预定时间之差即界面事件循环的延迟"""
+        now = time.monotonic()
+        if expected is not None:
+            metrics.UI_LOOP_LAG_SECONDS.observe(max(0.0, now - expected))
+        self.root.after(UI_LAG_INTERVAL_MS, self.sample_ui_lag, now + UI_LAG_INTERVAL_MS / 1000)
+    
+    def export_metrics(self):
+        """把性能指标快照写到用户选择的文件"""
+        save_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("Prometheus", "*.prom"), ("所有文件", "*.*")],
+            initialfile=os.path.basename(self.config.get_metrics_path() or "tts_metrics.json"),
+        )
+        if not save_path:
+            return
+        try:
+            metrics.REGISTRY.write_snapshot(save_path)
+            self.status_label.config(text=f"状态: 性能指标已导出 - {os.path.basename(save_path)}")
+        except OSError as e:
+            messagebox.showerror("错误", f"导出性能指标失败: {str(e)}")
+    
     def on_closing(self):
         """程序关闭时清理"""
         self.stop_play()
+        if self.export_job is not None:
+            self.export_job.cancel()
+        if self.player is not None:
+            self.player.shutdown()
         self.cleanup_temp_files()
-        pygame.mixer.quit()
+        self.split_executor.shutdown(wait=False)
+        self.history.close()
+        if self.runtime is not None:
+            self.runtime.stop()
+        if "pygame" in sys.modules:
+            sys.modules["pygame"].mixer.quit()
+        metrics_path = self.config.get_metrics_path()
+        if metrics_path:
+            try:
+                metrics.REGISTRY.write_snapshot(metrics_path)
+            except OSError as e:
+                logger.error(f"写出性能指标失败: {e}")
         self.root.destroy()
 
+    def record_history(self, generation):
+        """把本次转换的全文、句子位置和音频写入历史（后台执行）"""
+        if generation != self.applied_split_generation:
+            return
+        if self.document is not None:
+            # 大文件不写入历史，避免把整本书压缩进数据库
+            logger.info("大文件模式，不记录历史")
+            return
+        future = self.history.add(self.last_text_content, self.voice, self.rate, self.volume, self.pitch,
+                                  self.sentence_spans, self.audio_files, self.word_timelines)
+        future.add_done_callback(lambda f: f.exception() and logger.error(f"保存历史记录失败: {f.exception()}"))
+    
     def show_history(self):
         """显示历史记录"""
         history_window = tk.Toplevel(self.root)
@@ -950,35 +1423,102 @@ class TTSReader:
         listbox = tk.Listbox(history_window)
         scrollbar = ttk.Scrollbar(history_window, orient=tk.VERTICAL, command=listbox.yview)
         listbox.configure(yscrollcommand=scrollbar.set)
-        
-        # 添加历史记录
-        for item in self.config.config["history"]:
-            display_text = f"{item['timestamp']} | {item['voice']} | {item['sentences_count']}句 | {item['text']}"
-            listbox.insert(tk.END, display_text)
-        
         listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        listbox.insert(tk.END, "加载中...")
+        
+        documents = []
         
-        # 双击加载历史文本
+        def fill(items):
+            if not listbox.winfo_exists():
+                return
+            documents[:] = items
+            listbox.delete(0, tk.END)
+            for item in items:
+                audio_mark = " | 含音频" if item["has_audio"] else ""
+                display_text = (f"{item['timestamp']} | {item['voice']} | {item['sentences_count']}句"
+                                f"{audio_mark} | {item['preview']}")
+                listbox.insert(tk.END, display_text)
+            if not items:
+                listbox.insert(tk.END, "暂无历史记录")
+        
+        future = self.history.list_documents()
+        future.add_done_callback(lambda f: self.root.after(0, lambda: fill(f.result() if not f.exception() else [])))
+        
+        # 双击重新打开历史文档
         def on_double_click(event):
             selection = listbox.curselection()
-            if selection:
-                index = selection[0]
-                history_item = self.config.config["history"][index]
-                # 这里只能显示截断的文本，实际应用中可能需要存储完整文本
-                messagebox.showinfo("历史文本", f"文本预览:\n{history_item['text']}")
+            if selection and selection[0] < len(documents):
+                document_id = documents[selection[0]]["id"]
+                load_future = self.history.load(document_id)
+                load_future.add_done_callback(
+                    lambda f: self.root.after(0, lambda: self.open_history_document(f)))
+                history_window.destroy()
         
         listbox.bind("<Double-Button-1>", on_double_click)
-
+    
+    def open_history_document(self, future):
+        """载入历史文档；保存了音频的句子直接复用，无需重新合成"""
+        try:
+            document = future.result()
+        except Exception as e:
+            logger.error(f"读取历史记录失败: {e}", exc_info=True)
+            messagebox.showerror("错误", f"读取历史记录失败: {str(e)}")
+            return
+        if document is None:
+            messagebox.showwarning("警告", "该历史记录已不存在")
+            return
+        if self.is_converting:
+            messagebox.showwarning("警告", "正在转换，请稍后再打开历史记录")
+            return
+        
+        self.stop_play()
+        self.close_document()
+        self.reset_conversion_state()
+        self.voice = document["voice"]
+        self.voice_var.set(self.voice)
+        self.rate, self.volume, self.pitch = document["rate"], document["volume"], document["pitch"]
+        
+        text = document["text"]
+        if any(document["audio_files"]):
+            # 先作为“旧句子”放好，分割完成后按句子内容复用这些音频
+            self.sentences = [text[start:end] for start, end in document["spans"]]
+            self.sentence_languages = []
+            self.audio_files = document["audio_files"]
+            self.word_timelines = document["timelines"]
+        
+        self.text_widget.delete(1.0, tk.END)
+        self.text_widget.insert(1.0, text)
+        self.text_widget.edit_modified(False)
+        self.request_split(force=True)
+        self.status_label.config(text=f"状态: 已打开历史记录 - {document['timestamp']}")
+    
     def clear_history(self):
         """清空历史记录"""
         if messagebox.askyesno("确认", "确定要清空所有历史记录吗？"):
-            self.config.clear_history()
-            messagebox.showinfo("成功", "历史记录已清空")
+            future = self.history.clear()
+            future.add_done_callback(lambda f: self.root.after(0, lambda: messagebox.showinfo("成功", "历史记录已清空")))
 
 if __name__ == "__main__":
+    # 日志级别：命令行 --log-level 优先，其次配置文件
+    log_level, argv = parse_log_level(sys.argv[1:])
+    log_settings = Config().get_log_settings()
+    setup_logging(log_level or log_settings["level"], log_settings["log_file"],
+                  log_settings["max_bytes"], log_settings["backup_count"])
+    
+    if argv:
+        # 带参数运行时进入无界面批量模式，不创建窗口也不初始化音频设备
+        from batch_cli import main as batch_main
+        sys.exit(batch_main(argv))
+    
+    if tk is None:
+        logger.error("未安装 tkinter，无法启动图形界面；无界面批量转换请使用: python main.py --input ... --out ...")
+        sys.exit(1)
+    
+    startup_start = time.perf_counter()
     root = tk.Tk()
     app = TTSReader(root)
+    root.after_idle(lambda: logger.info(f"窗口就绪，耗时: {(time.perf_counter() - startup_start)*1000:.1f}ms"))
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
 
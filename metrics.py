@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 延迟直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """指标基类：按标签值组合分别统计"""
+
+    type = ""
+
+    def __init__(self, registry, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = registry.lock
+        self._series = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _labels(self, key):
+        return dict(zip(self.label_names, key))
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def _snapshot(self):
+        return [{"labels": self._labels(key), "value": value} for key, value in sorted(self._series.items())]
+
+    def _prometheus(self):
+        return [f"{self.name}{_format_labels(list(self._labels(key).items()))} {_format_value(value)}"
+                for key, value in sorted(self._series.items())]
+
+
+class Histogram(_Metric):
+    """固定桶的直方图，快照中给出按桶插值估算的分位数"""
+
+    type = "histogram"
+
+    def __init__(self, registry, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [各桶计数（最后一个为 +Inf）, 总和, 总数]
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def quantile(self, q, counts, total):
+        """在命中的桶内线性插值估算分位数，落在 +Inf 桶时返回最大的有限桶上限"""
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def _snapshot(self):
+        result = []
+        for key, (counts, total_sum, total) in sorted(self._series.items()):
+            entry = {"labels": self._labels(key), "count": total, "sum": total_sum}
+            for q in QUANTILES:
+                entry[f"p{int(q * 100)}"] = self.quantile(q, counts, total)
+            entry["buckets"] = {_format_value(le): count
+                                for le, count in zip(self.buckets + (float("inf"),), counts)}
+            result.append(entry)
+        return result
+
+    def _prometheus(self):
+        lines = []
+        for key, (counts, total_sum, total) in sorted(self._series.items()):
+            pairs = list(self._labels(key).items())
+            cumulative = 0
+            for le, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(le))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {total}")
+        return lines
+
+
+class MetricsRegistry:
+    """进程内的指标登记处，可导出为 JSON 或 Prometheus 文本格式
+
+    记录只是在锁内累加几个数字，不做格式化和磁盘写入，导出时才生成快照。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(Counter(self, name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, help_text, label_names, buckets))
+
+    def snapshot(self):
+        """当前所有指标的字典快照"""
+        with self.lock:
+            return {
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+                "metrics": {
+                    name: {"type": metric.type, "help": metric.help, "series": metric._snapshot()}
+                    for name, metric in self._metrics.items()
+                },
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            for name, metric in self._metrics.items():
+                lines.append(f"# HELP {name} {metric.help}")
+                lines.append(f"# TYPE {name} {metric.type}")
+                lines.extend(metric._prometheus())
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path):
+        """写出快照：.prom / .txt 后缀为 Prometheus 文本格式，其余为 JSON"""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        logger.info(f"性能指标已写入: {path}")
+        return path
+
+
+REGISTRY = MetricsRegistry()
+
+# 合成请求
+REQUEST_SECONDS = REGISTRY.histogram(
+    "tts_request_seconds", "单次合成请求耗时（秒），含失败的尝试", ("voice", "backend", "outcome"))
+REQUESTS = REGISTRY.counter("tts_requests_total", "合成请求次数", ("voice", "backend", "outcome"))
+RETRIES = REGISTRY.counter("tts_retries_total", "按错误类型统计的重试次数", ("kind",))
+BREAKER_TRIPS = REGISTRY.counter("tts_circuit_breaker_trips_total", "限流断路器断开次数")
+BYTES_RECEIVED = REGISTRY.counter("tts_bytes_received_total", "收到的音频字节数", ("voice",))
+CACHE_LOOKUPS = REGISTRY.counter("tts_cache_lookups_total", "音频缓存查询次数", ("result",))
+
+# 调度与界面
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("tts_queue_wait_seconds", "等待并发窗口空位的时间（秒）")
+UI_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "tts_ui_loop_lag_seconds", "界面事件循环的定时器延迟（秒）",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
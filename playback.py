@@ -0,0 +1,246 @@
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from audio_utils import is_in_memory
+
+logger = logging.getLogger(__name__)
+
+
+class PlaybackEngine:
+    """基于 pygame 声道排队的播放引擎
+
+    后台线程预先解码后面的句子，下一句提前排进声道队列，句子之间的衔接由混音器
+    完成，不再依赖界面定时器；定时器只负责更新高亮和补充队列。
+    """
+
+    POLL_MS = 30  # 检查声道队列的间隔（毫秒），不影响句子衔接
+
+    def __init__(self, root, get_audio, sentence_count, can_wait, on_start=None, on_wait=None, on_finish=None,
+                 gap_ms=0, lookahead=2, on_tick=None):
+        self.root = root
+        self.get_audio = get_audio  # 返回句子的音频条目，尚未生成时返回 None
+        self.sentence_count = sentence_count
+        self.can_wait = can_wait  # 音频尚未生成时是否等待（转换仍在进行）
+        self.on_start = on_start
+        self.on_wait = on_wait
+        self.on_finish = on_finish
+        self.on_tick = on_tick  # 播放中每次轮询时调用，用于按播放时钟更新词高亮
+        self.gap_ms = gap_ms  # 句子之间的停顿（毫秒），0 为无缝衔接
+        self.lookahead = lookahead  # 预解码后面几句
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-decode")
+        self._decoded = {}  # 句子索引 -> (音频条目, 解码 Future)
+        self._channel = None
+        self._after_id = None
+        self._queued = None  # 已排进声道队列的下一句
+        self._wait_notified = None
+        self._paused_state = None
+        # 播放时钟：当前句开始播放的时刻，排队的下一句在当前句结束时接上
+        self._started_at = None
+        self._paused_at = None
+        self._current_length = 0.0
+        self._queued_length = 0.0
+        self.current = None  # 正在播放或等待的句子
+        self.continuous = True
+        self.state = "stopped"  # stopped / waiting / playing / paused
+
+    def _ensure_channel(self):
+        if self._channel is None:
+            pygame.mixer.set_reserved(1)
+            self._channel = pygame.mixer.Channel(0)
+        return self._channel
+
+    def _decode(self, audio):
+        """把MP3解码为 Sound，需要停顿时在末尾补静音"""
+        sound = pygame.mixer.Sound(file=io.BytesIO(audio) if is_in_memory(audio) else audio)
+        if self.gap_ms > 0:
+            frequency, size, channels = pygame.mixer.get_init()
+            frame_bytes = abs(size) // 8 * channels
+            gap_bytes = int(frequency * self.gap_ms / 1000) * frame_bytes
+            sound = pygame.mixer.Sound(buffer=sound.get_raw() + bytes(gap_bytes))
+        return sound
+
+    def _prefetch(self, index):
+        """提交后台解码，返回 Future；音频尚未生成时返回 None"""
+        if index >= self.sentence_count():
+            return None
+        audio = self.get_audio(index)
+        if not audio:
+            return None
+        cached = self._decoded.get(index)
+        if cached is not None and cached[0] is audio:
+            return cached[1]
+        future = self._executor.submit(self._decode, audio)
+        self._decoded[index] = (audio, future)
+        return future
+
+    def _prefetch_ahead(self, index):
+        for i in range(index, index + 1 + self.lookahead):
+            self._prefetch(i)
+        # 丢弃已经播放过的解码结果
+        for i in [i for i in self._decoded if i < index]:
+            del self._decoded[i]
+
+    def _ready_sound(self, index):
+        """返回已解码的 Sound，解码未完成时返回 None，解码失败时抛出异常"""
+        future = self._prefetch(index)
+        if future is None or not future.done():
+            return None
+        return future.result()
+
+    def play(self, index, continuous=True):
+        """从指定句子开始播放；continuous 为 False 时只播放这一句"""
+        self.stop()
+        self.continuous = continuous
+        self.current = index
+        self.state = "waiting"
+        self._prefetch_ahead(index)
+        self._tick()
+
+    def pause(self):
+        """暂停"""
+        if self.state in ("playing", "waiting"):
+            if self._channel is not None:
+                self._channel.pause()
+            self._paused_state = self.state
+            self._paused_at = time.monotonic()
+            self.state = "paused"
+            self._cancel_tick()
+
+    def resume(self):
+        """从暂停处继续"""
+        if self.state == "paused":
+            if self._channel is not None:
+                self._channel.unpause()
+            self.state = self._paused_state
+            if self._started_at is not None:
+                self._started_at += time.monotonic() - self._paused_at
+            self._tick()
+
+    def stop(self):
+        """停止播放并清空声道队列"""
+        self._cancel_tick()
+        if self._channel is not None:
+            self._channel.stop()
+        self.state = "stopped"
+        self._queued = None
+        self._wait_notified = None
+        self._started_at = None
+        self.current = None
+
+    def position(self):
+        """当前句已播放的秒数，没有在播放时返回 None"""
+        if self._started_at is None or self.state not in ("playing", "paused"):
+            return None
+        now = self._paused_at if self.state == "paused" else time.monotonic()
+        return max(0.0, now - self._started_at)
+
+    def shutdown(self):
+        """停止播放并关闭解码线程"""
+        self.stop()
+        self._executor.shutdown(wait=False)
+
+    def _cancel_tick(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        self._after_id = None
+        if self.state not in ("waiting", "playing"):
+            return
+        channel = self._ensure_channel()
+
+        if self.state == "waiting":
+            self._start_current(channel)
+        else:
+            if self._queued is not None and channel.get_queue() is None:
+                # 排队的下一句已由混音器无缝接上
+                self.current = self._queued
+                self._queued = None
+                self._started_at += self._current_length
+                self._current_length = self._queued_length
+                self._prefetch_ahead(self.current)
+                if self.on_start:
+                    self.on_start(self.current)
+            if not channel.get_busy():
+                # 当前句已结束，下一句没来得及排队（尚未生成或解码）
+                if not self.continuous:
+                    self._finish()
+                    return
+                self.current += 1
+                self.state = "waiting"
+                self._start_current(channel)
+            elif self.continuous and self._queued is None:
+                self._queue_next(channel)
+
+        if self.state == "playing" and self.on_tick:
+            self.on_tick(self.current, self.position())
+        if self.state in ("waiting", "playing"):
+            self._after_id = self.root.after(self.POLL_MS, self._tick)
+
+    def _start_current(self, channel):
+        """开始播放当前句；音频未就绪时等待，无法再生成时跳过"""
+        while True:
+            if self.current >= self.sentence_count():
+                self._finish()
+                return
+            try:
+                sound = self._ready_sound(self.current)
+            except Exception as e:
+                logger.error(f"句子 {self.current+1} 解码失败: {e}")
+                sound = None
+                skip = True
+            else:
+                skip = sound is None and not self.get_audio(self.current) and not self.can_wait()
+
+            if sound is not None:
+                channel.play(sound)
+                self._started_at = time.monotonic()
+                self._current_length = sound.get_length()
+                self.state = "playing"
+                self._wait_notified = None
+                self._prefetch_ahead(self.current)
+                if self.on_start:
+                    self.on_start(self.current)
+                if self.continuous:
+                    self._queue_next(channel)
+                return
+
+            if not skip:
+                # 音频仍在转换或解码中
+                if self._wait_notified != self.current:
+                    self._wait_notified = self.current
+                    if self.on_wait:
+                        self.on_wait(self.current)
+                return
+
+            logger.warning(f"句子 {self.current+1} 没有音频，跳过")
+            if not self.continuous:
+                self._finish()
+                return
+            self.current += 1
+
+    def _queue_next(self, channel):
+        """把已解码的下一句排进声道队列"""
+        next_index = self.current + 1
+        if next_index >= self.sentence_count():
+            return
+        try:
+            sound = self._ready_sound(next_index)
+        except Exception:
+            return  # 轮到该句时再处理解码失败
+        if sound is not None:
+            channel.queue(sound)
+            self._queued = next_index
+            self._queued_length = sound.get_length()
+
+    def _finish(self):
+        self.state = "stopped"
+        self._queued = None
+        if self.on_finish:
+            self.on_finish()
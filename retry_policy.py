@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import random
+import re
+import time
+
+from tts_backends import ThrottledError
+
+logger = logging.getLogger(__name__)
+
+# 错误类型
+THROTTLED = "throttled"  # 服务端限流：退避更久，并收缩并发
+TRANSIENT = "transient"  # 网络抖动、连接重置、空音频等：退避后重试
+PERMANENT = "permanent"  # 参数错误、语音不存在等：重试也不会成功
+
+# 没有状态码属性的错误只按消息中独立的 429 或 "Too Many Requests" 判断为限流，
+# 不把 14290、1.429、第429句、429.mp3 之类包含这几个数字的消息当作限流
+_THROTTLE_MESSAGE = re.compile(r"(?<![\w.])429(?![\w.])|too many requests", re.IGNORECASE)
+
+
+def classify_error(error):
+    """判断错误类型，决定是否重试以及如何退避"""
+    if isinstance(error, ThrottledError):
+        return THROTTLED
+    # aiohttp 的 ClientResponseError / WSServerHandshakeError 带有 HTTP 状态码
+    status = getattr(error, "status", None)
+    if status == 429 or (status is None and _THROTTLE_MESSAGE.search(str(error))):
+        return THROTTLED
+    # 403 多为时钟偏差导致的签名失效，408 为超时，均可重试
+    if isinstance(status, int) and 400 <= status < 500 and status not in (403, 408):
+        return PERMANENT
+    if isinstance(error, (ValueError, TypeError)):
+        return PERMANENT
+    return TRANSIENT
+
+
+class RetryPolicy:
+    """指数退避加随机抖动（full jitter），限流时使用更长的基础等待"""
+
+    def __init__(self, max_attempts=4, base_delay=0.5, throttle_delay=2.0, max_delay=30.0, seed=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.throttle_delay = throttle_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+
+    def should_retry(self, kind, attempt):
+        """attempt 从 0 开始计数"""
+        return kind != PERMANENT and attempt + 1 < self.max_attempts
+
+    def delay(self, kind, attempt):
+        """第 attempt 次失败后的等待秒数，在 [0, 上限) 内随机，避免大量请求同时重试"""
+        base = self.throttle_delay if kind == THROTTLED else self.base_delay
+        return self._random.uniform(0, min(self.max_delay, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """限流断路器：连续限流达到阈值后断开一段时间，期间新的请求全部等待
+
+    冷却结束后放行请求试探；再次连续限流则冷却时间加倍，成功一次即恢复初始冷却时间。
+    """
+
+    def __init__(self, threshold=3, cooldown=5.0, max_cooldown=60.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.consecutive_throttles = 0
+        self.open_until = 0.0
+        self.trips = 0  # 断开次数
+
+    @property
+    def is_open(self):
+        return time.monotonic() < self.open_until
+
+    async def wait(self):
+        """断路器断开时等待到冷却结束"""
+        while True:
+            remaining = self.open_until - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    def record_success(self):
+        self.consecutive_throttles = 0
+        self.cooldown = self.base_cooldown
+
+    def record_throttle(self):
+        """记录一次限流，本次导致断路器断开时返回 True"""
+        self.consecutive_throttles += 1
+        if self.consecutive_throttles < self.threshold or self.is_open:
+            return False
+        self.consecutive_throttles = 0
+        self.open_until = time.monotonic() + self.cooldown
+        self.trips += 1
+        logger.warning(f"连续限流，暂停请求 {self.cooldown:.1f}s")
+        self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+        return True
@@ -0,0 +1,148 @@
+import asyncio
+import bisect
+import collections
+import logging
+import threading
+import time
+
+from metrics import QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class SynthesisScheduler:
+    """按播放位置调度句子合成顺序：总是优先合成当前位置之后最近的句子"""
+
+    def __init__(self, indices=(), anchor=0):
+        self._lock = threading.Lock()
+        self._pending = sorted(set(indices))  # 有序的待合成句子索引
+        self._anchor = anchor
+
+    def set_anchor(self, index):
+        """更新播放/点击位置，之后取出的任务以该位置为起点"""
+        with self._lock:
+            self._anchor = index
+
+    @property
+    def anchor(self):
+        return self._anchor
+
+    def add(self, indices):
+        """把句子（重新）加入待合成队列"""
+        with self._lock:
+            for index in indices:
+                pos = bisect.bisect_left(self._pending, index)
+                if pos == len(self._pending) or self._pending[pos] != index:
+                    self._pending.insert(pos, index)
+
+    def discard(self, index):
+        """从队列中移除句子"""
+        with self._lock:
+            pos = bisect.bisect_left(self._pending, index)
+            if pos < len(self._pending) and self._pending[pos] == index:
+                del self._pending[pos]
+
+    def next(self):
+        """取出下一个要合成的句子：位置之后最近的优先，全部完成后再回头处理之前的句子"""
+        with self._lock:
+            if not self._pending:
+                return None
+            pos = bisect.bisect_left(self._pending, self._anchor)
+            if pos == len(self._pending):
+                pos = 0
+            return self._pending.pop(pos)
+
+    def __len__(self):
+        return len(self._pending)
+
+
+class AdaptiveConcurrency:
+    """AIMD自适应并发窗口：请求顺利时线性扩大，出错或延迟明显升高时成倍收缩"""
+
+    def __init__(self, ceiling, initial=2, floor=1, decrease_factor=0.5, latency_tolerance=3.0):
+        self.ceiling = max(floor, ceiling)
+        self.floor = floor
+        self.limit = float(max(floor, min(initial, self.ceiling)))
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance  # 延迟超过基线多少倍视为拥塞
+        self.in_flight = 0
+        self.min_latency = None  # 观测到的最低延迟，作为无拥塞基线
+        self.smoothed_latency = None
+        self._last_decrease = 0.0
+        self._waiters = collections.deque()  # 按到达顺序排队的等待者
+
+    async def acquire(self):
+        """等待并发窗口中出现空位，先到先得
+
+        空位由 release 直接交给队首的等待者，每次只唤醒需要的个数，
+        大量协程排队时不会每归还一个空位就把所有等待者都唤醒检查一遍。
+        """
+        wait_start = time.monotonic()
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # 空位已经交过来但任务被取消，归还给下一个等待者
+                    self.in_flight -= 1
+                    self._wake_waiters()
+                else:
+                    self._waiters.remove(waiter)
+                raise
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - wait_start)
+
+    async def release(self, latency=None, ok=True, size=0):
+        """归还空位并根据本次请求的结果调整窗口（latency为None表示未发出网络请求）"""
+        self.in_flight -= 1
+        if ok and latency is not None:
+            # 合成耗时随句子长度增长，按长度归一化后再比较
+            self._on_success(latency / (1.0 + size / 40.0))
+        elif not ok:
+            self._decrease()
+        self._wake_waiters()
+
+    async def throttle(self, to_floor=False):
+        """服务端限流时立即收缩窗口；断路器断开时直接降到下限"""
+        if to_floor:
+            if self.limit > self.floor:
+                logger.info(f"并发窗口收缩: {self.limit:.1f} -> {self.floor:.1f}（断路器断开）")
+            self.limit = float(self.floor)
+            self._last_decrease = time.monotonic()
+        else:
+            self._decrease()
+
+    def _wake_waiters(self):
+        # 窗口有多少空位就按顺序交给多少个等待者，空位随之记入 in_flight
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _on_success(self, latency):
+        if self.min_latency is None or latency < self.min_latency:
+            self.min_latency = latency
+        if self.smoothed_latency is None:
+            self.smoothed_latency = latency
+        else:
+            self.smoothed_latency = 0.8 * self.smoothed_latency + 0.2 * latency
+
+        if self.smoothed_latency > self.min_latency * self.latency_tolerance:
+            self._decrease()
+        else:
+            # 加性增长：每完成一个窗口的请求，窗口加一
+            self.limit = min(self.ceiling, self.limit + 1.0 / self.limit)
+
+    def _decrease(self):
+        # 一个往返时间内只收缩一次，避免同一波拥塞导致连续减半
+        now = time.monotonic()
+        if self.limit <= self.floor or now - self._last_decrease < (self.smoothed_latency or 1.0):
+            return
+        self._last_decrease = now
+        old_limit = self.limit
+        self.limit = max(self.floor, self.limit * self.decrease_factor)
+        logger.info(f"并发窗口收缩: {old_limit:.1f} -> {self.limit:.1f}")
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+
+from audio_cache import AudioCache
+from metrics import BREAKER_TRIPS, BYTES_RECEIVED, CACHE_LOOKUPS, REQUEST_SECONDS, REQUESTS, RETRIES
+from retry_policy import THROTTLED, CircuitBreaker, RetryPolicy, classify_error
+from tts_backends import EdgeTTSBackend, SynthesisError
+from word_timeline import WordTimeline
+
+logger = logging.getLogger(__name__)
+
+
+class SentenceSynthesizer:
+    """单句合成：先查持久化缓存，未命中再请求合成后端，失败按错误类型退避重试
+
+    断路器在所有句子之间共享：连续限流时暂停全部请求，并把并发窗口降到下限。
+    """
+
+    def __init__(self, cache=None, backend=None, retry_policy=None, breaker=None):
+        self.cache = cache
+        self.backend = backend or EdgeTTSBackend()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+
+    async def synthesize(self, sentence, voice, rate="+0%", volume="+0%", pitch="+0Hz", index=0, limiter=None):
+        """合成单句，返回 (音频字节, 是否命中缓存, 词边界时间轴)；没有词边界信息时时间轴为 None
+
+        limiter 为调用方的 AdaptiveConcurrency，限流时据此收缩并发；重试用尽后抛出最后一次的异常。
+        """
+        start_time = time.monotonic()
+        logger.debug(f"开始转换句子 {index+1}: {sentence[:50]}...")
+
+        # 先查询持久化缓存，命中则跳过网络请求
+        cache_key = None
+        timeline_key = None
+        if self.cache is not None:
+            cache_key = AudioCache.make_key(sentence, voice, rate, volume, pitch, self.backend.cache_namespace)
+            # 时间轴与音频分开缓存，缺失时只是退回整句高亮
+            timeline_key = AudioCache.make_key(sentence, voice, rate, volume, pitch,
+                                               self.backend.cache_namespace + ":words")
+            audio_data = self.cache.get_bytes(cache_key)
+            CACHE_LOOKUPS.inc(result="hit" if audio_data else "miss")
+            if audio_data:
+                timeline_data = self.cache.get_bytes(timeline_key)
+                timeline = WordTimeline.from_bytes(timeline_data) if timeline_data else None
+                logger.debug(f"句子 {index+1} 命中缓存")
+                return audio_data, True, timeline
+
+        audio_data = b""
+        timeline = None
+        attempt = 0
+        while True:
+            # 断路器断开期间不发请求
+            await self.breaker.wait()
+            try:
+                # 网络请求，音频分片直接收集到内存
+                stream_start = time.monotonic()
+
+                chunks = []
+                boundaries = []
+                async for chunk in self.backend.stream(sentence, voice, rate, volume, pitch):
+                    if chunk["type"] == "audio":
+                        chunks.append(chunk["data"])
+                    elif chunk["type"] == "WordBoundary":
+                        boundaries.append(chunk)
+                audio_data = b"".join(chunks)
+                if not audio_data:
+                    raise SynthesisError("生成音频为空")
+
+                REQUEST_SECONDS.observe(time.monotonic() - stream_start, voice=voice, backend=self.backend.name,
+                                        outcome="ok")
+                REQUESTS.inc(voice=voice, backend=self.backend.name, outcome="ok")
+                BYTES_RECEIVED.inc(len(audio_data), voice=voice)
+
+                self.breaker.record_success()
+                timeline = WordTimeline.from_boundaries(sentence, boundaries) if boundaries else None
+                if cache_key is not None:
+                    self.cache.put_bytes(cache_key, audio_data)
+                    if timeline:
+                        self.cache.put_bytes(timeline_key, timeline.to_bytes())
+                break  # 成功
+
+            except Exception as e:
+                kind = classify_error(e)
+                REQUEST_SECONDS.observe(time.monotonic() - stream_start, voice=voice, backend=self.backend.name,
+                                        outcome=kind)
+                REQUESTS.inc(voice=voice, backend=self.backend.name, outcome=kind)
+                logger.error(f"句子 {index+1} 尝试 {attempt+1} 失败（{kind}）: {str(e)}")
+                if kind == THROTTLED:
+                    tripped = self.breaker.record_throttle()
+                    if tripped:
+                        BREAKER_TRIPS.inc()
+                    if limiter is not None:
+                        await limiter.throttle(to_floor=tripped)
+                if not self.retry_policy.should_retry(kind, attempt):
+                    raise
+                delay = self.retry_policy.delay(kind, attempt)
+                RETRIES.inc(kind=kind)
+                logger.debug(f"句子 {index+1} {delay:.2f}s 后重试")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        logger.debug(f"句子 {index+1} 转换完成，总耗时: {(time.monotonic() - start_time)*1000:.1f}ms，"
+                     f"音频大小: {len(audio_data)} bytes")
+
+        return audio_data, False, timeline
@@ -0,0 +1,195 @@
+import bisect
+import codecs
+import logging
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+
+from text_splitter import split_chunk_spans
+
+logger = logging.getLogger(__name__)
+
+BLOCK_BYTES = 1024 * 1024  # 每次增量分割的字节数，块边界对齐到换行
+CACHED_BLOCKS = 8  # 保留解码结果的块数
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+
+def guess_encoding(path):
+    """取文件开头判断编码：能按 UTF-8 解码则用 UTF-8，否则按 GB18030 处理"""
+    with open(path, "rb") as f:
+        sample = f.read(ENCODING_SAMPLE_BYTES)
+    try:
+        # 增量解码，样本末尾被截断的多字节字符不算错误
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "gb18030"
+
+
+def _default_split(text):
+    pieces = []
+    spans = split_chunk_spans(text, pieces=pieces)
+    return spans, ["zh"] * len(spans), pieces
+
+
+class MappedTextDocument:
+    """用 mmap 打开的大文本文件，边建立句子索引边供转换和显示使用
+
+    文件按换行对齐切成若干块，iter_index 逐块解码、分割并追加句子位置，
+    调用方在索引完成前就可以使用已分割出的句子。句子位置是整篇文档中的字符偏移，
+    句子文本按需从映射中解码，只缓存最近用到的几块。
+    换行符在 UTF-8、GB18030、Shift_JIS 中都不会出现在多字节字符内部，所以每块可以独立解码。
+    """
+
+    def __init__(self, path, encoding="utf-8", split=_default_split):
+        if "\n".encode(encoding) != b"\n":
+            raise ValueError(f"不支持的编码: {encoding}")
+        self.path = path
+        self.encoding = encoding
+        self.split = split  # text -> (分块位置列表, 语言列表, 合并前的句子位置列表)
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self._data_start = len(codecs.BOM_UTF8) if self._map[:3] == codecs.BOM_UTF8 else 0
+
+        self._lock = threading.Lock()
+        self._block_bytes = []  # 每块的 (字节起始, 字节结束)
+        self._block_chars = array("q")  # 每块起始的字符偏移
+        self._cache = OrderedDict()  # 块序号 -> 解码后的文本
+        self.starts = array("q")  # 分块（合成单位，下称句子）起始字符偏移，只追加，可直接二分查找
+        self.ends = array("q")
+        self.languages = []
+        self.piece_starts = array("q")  # 合并前的原句位置，用于逐句高亮和点击定位
+        self.piece_ends = array("q")
+        self.indexed_bytes = 0
+        self.finished = False
+        self.closed = False
+        self.ready = threading.Event()  # 第一块索引完成（或文件为空）
+        self.sentences = _SentenceView(self)
+        self.spans = _SpanView(self.starts, self.ends)
+        self.pieces = _SpanView(self.piece_starts, self.piece_ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def iter_index(self):
+        """逐块建立句子索引的生成器，每处理完一块产出当前的句子总数"""
+        position = self._data_start
+        char_base = 0
+        try:
+            while position < self.size:
+                end = self._block_end(position)
+                with self._lock:
+                    if self.closed:
+                        return
+                    text = self._decode(position, end)
+                    block = len(self._block_bytes)
+                    self._block_bytes.append((position, end))
+                    self._block_chars.append(char_base)
+                    self._remember(block, text)
+                spans, languages, pieces = self.split(text)
+                # 先追加原句、结束位置和语言，最后追加起始位置，读取方以 len(starts) 为准
+                self.piece_ends.extend(char_base + piece_end for _, piece_end in pieces)
+                self.piece_starts.extend(char_base + piece_start for piece_start, _ in pieces)
+                self.ends.extend(char_base + span_end for _, span_end in spans)
+                self.languages.extend(languages)
+                self.starts.extend(char_base + span_start for span_start, _ in spans)
+                char_base += len(text)
+                position = end
+                self.indexed_bytes = end
+                self.ready.set()
+                yield len(self.starts)
+            self.finished = True
+        finally:
+            self.ready.set()
+
+    def _block_end(self, position):
+        """块结束位置：在 BLOCK_BYTES 以内的最后一个换行之后，一整行过长时延伸到下一个换行"""
+        end = position + BLOCK_BYTES
+        if end >= self.size:
+            return self.size
+        newline = self._map.rfind(b"\n", position, end)
+        if newline < 0:
+            newline = self._map.find(b"\n", end)
+        return self.size if newline < 0 else newline + 1
+
+    def _decode(self, start, end):
+        return self._map[start:end].decode(self.encoding, errors="replace")
+
+    def _remember(self, block, text):
+        self._cache[block] = text
+        self._cache.move_to_end(block)
+        while len(self._cache) > CACHED_BLOCKS:
+            self._cache.popitem(last=False)
+
+    def _block_text(self, block):
+        text = self._cache.get(block)
+        if text is None:
+            text = self._decode(*self._block_bytes[block])
+        self._remember(block, text)
+        return text
+
+    def text(self, start, end):
+        """取 [start, end) 字符范围的文本，只解码涉及的块"""
+        with self._lock:
+            if self.closed:
+                return ""
+            block = max(0, bisect.bisect_right(self._block_chars, start) - 1)
+            pieces = []
+            while block < len(self._block_chars) and self._block_chars[block] < end:
+                base = self._block_chars[block]
+                pieces.append(self._block_text(block)[max(0, start - base):end - base])
+                block += 1
+            return "".join(pieces)
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._cache.clear()
+            if self.size:
+                self._map.close()
+            self._file.close()
+
+
+class _SentenceView(Sequence):
+    """按需解码的句子列表，长度随索引增长"""
+
+    def __init__(self, document):
+        self._document = document
+
+    def __len__(self):
+        return len(self._document.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        document = self._document
+        start = document.starts[index]  # 越界时抛出 IndexError
+        if index < 0:
+            index += len(document.starts)
+        return document.text(start, document.ends[index])
+
+
+class _SpanView(Sequence):
+    """由起始、结束两个数组组成的 (起始, 结束) 字符位置列表"""
+
+    def __init__(self, starts, ends):
+        self._starts = starts
+        self._ends = ends
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        starts = self._starts
+        start = starts[index]
+        if index < 0:
+            index += len(starts)
+        return start, self._ends[index]
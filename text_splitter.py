@@ -0,0 +1,260 @@
+import re
+import zlib
+
+# 各语言的句子分隔符：句号、问号、感叹号、换行等
+SENTENCE_DELIMITERS = {
+    "ja": "。！？\n．",
+    "en": ".!?\n",
+    "zh": "。！？\n",
+}
+
+# 匹配分隔符之间的片段，finditer 直接给出每个片段在原文中的位置
+_SENTENCE_PATTERNS = {
+    language: re.compile(f"[^{re.escape(delimiters)}]+")
+    for language, delimiters in SENTENCE_DELIMITERS.items()
+}
+
+
+# 用拉丁字母书写的语言：与英文使用相同的分割规则，语言检测中也都归为 "en"（拉丁字母文本）
+LATIN_SCRIPT_LANGUAGES = {
+    "af", "ca", "cs", "cy", "da", "de", "en", "es", "et", "eu", "fi", "fil", "fr", "ga", "gl",
+    "hr", "hu", "id", "is", "it", "jv", "lt", "lv", "ms", "mt", "nb", "nl", "pl", "pt", "ro",
+    "sk", "sl", "so", "sq", "su", "sv", "sw", "tr", "uz", "vi", "zu",
+}
+
+
+def language_for_locale(locale):
+    """根据地区代码（如 ja-JP、fr-FR）选择分割规则
+
+    拉丁字母书写的语言使用英文规则，中文及其他未知语言使用中文规则。
+    """
+    language = locale.split("-")[0].lower()
+    if language in LATIN_SCRIPT_LANGUAGES:
+        return "en"
+    return language if language in SENTENCE_DELIMITERS else "zh"
+
+
+def language_for_voice(voice):
+    """根据语音名称选择分割规则（语音名称以地区代码开头）"""
+    return language_for_locale(voice)
+
+
+def split_sentence_spans(text, language="zh"):
+    """分割句子，返回每个句子在原文中的 (起始, 结束) 字符位置（已去除首尾空白）"""
+    return _match_spans(_SENTENCE_PATTERNS.get(language, _SENTENCE_PATTERNS["zh"]), text)
+
+
+def _match_spans(pattern, text):
+    spans = []
+    for match in pattern.finditer(text):
+        segment = match.group()
+        left = len(segment) - len(segment.lstrip())
+        right = len(segment.rstrip())
+        if right > left:
+            start = match.start()
+            spans.append((start + left, start + right))
+    return spans
+
+
+# 超长句子优先在这些分句标点之后截断
+CLAUSE_DELIMITERS = {
+    "ja": "、，；：,;",
+    "en": ",;:",
+    "zh": "，、；：,;",
+}
+
+_CLAUSE_PATTERNS = {
+    language: re.compile(f"[{re.escape(delimiters)}]")
+    for language, delimiters in CLAUSE_DELIMITERS.items()
+}
+
+
+def _strip_span(text, start, end):
+    """去除片段首尾空白，全为空白时返回 None"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return (start, end) if end > start else None
+
+
+def _split_oversized(text, start, end, max_chars, clause_pattern):
+    """把超过 max_chars 的句子在分句标点处切开，没有标点时在空白处或按长度硬切"""
+    pieces = []
+    while end - start > max_chars:
+        limit = start + max_chars
+        cut = None
+        for match in clause_pattern.finditer(text, start, limit):
+            cut = match.end()
+        if cut is None:
+            space = text.rfind(" ", start + 1, limit)
+            cut = space if space > start else limit
+        piece = _strip_span(text, start, cut)
+        if piece:
+            pieces.append(piece)
+        start = cut
+    piece = _strip_span(text, start, end)
+    if piece:
+        pieces.append(piece)
+    return pieces
+
+
+# 内容锚点：校验值能被该数整除的句子总是开始新的分块。锚点只取决于句子本身的内容，
+# 插入或删除一句只影响到下一个锚点为止的分块，其后的分块不变，音频可以复用；
+# 单纯贪心合并时，句长相近的文本在改动处之后的所有边界都会错开
+CHUNK_ANCHOR_INTERVAL = 16
+
+
+def _is_anchor(text, start, end):
+    return zlib.crc32(text[start:end].encode("utf-8")) % CHUNK_ANCHOR_INTERVAL == 0
+
+
+def chunk_spans(text, spans, language="zh", target_chars=80, max_chars=200, pieces=None):
+    """把句子位置整理为合成请求的分块
+
+    相邻的短句合并到 target_chars 以内，超过 max_chars 的句子在分句标点处切开，
+    从而减少请求次数又不让单个请求过长。返回的分块仍是原文中的 (起始, 结束) 位置。
+    合并不跨越内容锚点（见 CHUNK_ANCHOR_INTERVAL），使分块边界在编辑后保持稳定。
+    target_chars 或 max_chars 为 0 时不做相应处理。
+    传入 pieces 列表时按顺序追加合并前的每个句子（超长句子切开后的每段）的位置，
+    界面据此逐句高亮和定位点击，而不是把整个分块当作一句。
+    """
+    clause_pattern = _CLAUSE_PATTERNS.get(language, _CLAUSE_PATTERNS["zh"])
+    target_chars = min(target_chars, max_chars) if max_chars > 0 else target_chars
+    chunks = []
+    for start, end in spans:
+        if max_chars > 0 and end - start > max_chars:
+            sentence_pieces = _split_oversized(text, start, end, max_chars, clause_pattern)
+        else:
+            sentence_pieces = [(start, end)]
+        for piece_start, piece_end in sentence_pieces:
+            # 与上一块合并后（含中间的标点和空白）仍不超过目标长度则合并
+            if (chunks and piece_end - chunks[-1][0] <= target_chars
+                    and not _is_anchor(text, piece_start, piece_end)):
+                chunks[-1] = (chunks[-1][0], piece_end)
+            else:
+                chunks.append((piece_start, piece_end))
+        if pieces is not None:
+            pieces.extend(sentence_pieces)
+    return chunks
+
+
+def split_chunk_spans(text, language="zh", target_chars=80, max_chars=200, pieces=None):
+    """分割句子并整理为合成分块，pieces 的含义同 chunk_spans"""
+    return chunk_spans(text, split_sentence_spans(text, language), language, target_chars, max_chars, pieces)
+
+
+# 语言检测用的字符类别：假名、汉字、拉丁字母的码位范围，各自映射为一个标记字符
+_KANA, _HAN, _LATIN = "\x01", "\x02", "\x03"
+_CHARACTER_RANGES = (
+    (_KANA, ((0x3040, 0x30FF), (0x31F0, 0x31FF), (0xFF66, 0xFF9F))),
+    (_HAN, ((0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF))),
+    (_LATIN, ((0x41, 0x5A), (0x61, 0x7A), (0xC0, 0x24F))),
+)
+_CLASS_PATTERNS = {
+    marker: re.compile("[" + "".join(f"{chr(low)}-{chr(high)}" for low, high in ranges) + "]")
+    for marker, ranges in _CHARACTER_RANGES
+}
+_SINGLE_SCRIPT_LANGUAGES = {_KANA: "ja", _LATIN: "en"}  # 只有汉字时中日文都可能，另行判断
+_HAN_LANGUAGES = ("zh", "ja")
+_class_table = None
+
+# 一个汉字大致相当于几个拉丁字母（一个英文单词）
+LATIN_PER_CJK = 3
+
+# 混合文本的句子：中日文句末标点和换行总是断句，英文句末标点只在后面是空白、
+# 结尾或非 ASCII 字符时断句，避免拆开 3.14、v1.2 等
+_LATIN_TERMINATORS = SENTENCE_DELIMITERS["en"].replace("\n", "")
+_MIXED_SENTENCE_PATTERN = re.compile(
+    f"(?:[^{re.escape(SENTENCE_DELIMITERS['ja'] + SENTENCE_DELIMITERS['en'])}]"
+    f"|[{re.escape(_LATIN_TERMINATORS)}](?=[\\x21-\\x7e]))+")
+
+
+def character_classes(text):
+    """把文本中的假名、汉字、拉丁字母替换为对应的标记字符，长度和位置不变
+
+    str.translate 在C层一次处理整段文本，之后每句只需对标记做 str.count，
+    不在 Python 里逐字判断码位。
+    """
+    global _class_table
+    if _class_table is None:
+        # 原文中的标记字符先换成空格，避免被误计
+        table = {ord(marker): " " for marker, _ in _CHARACTER_RANGES}
+        for marker, ranges in _CHARACTER_RANGES:
+            for low, high in ranges:
+                table.update(dict.fromkeys(range(low, high + 1), marker))
+        _class_table = table
+    return text.translate(_class_table)
+
+
+def _detect_language(classes, start, end, han_language="zh"):
+    kana = classes.count(_KANA, start, end)
+    han = classes.count(_HAN, start, end)
+    latin = classes.count(_LATIN, start, end)
+    if latin > (kana + han) * LATIN_PER_CJK:
+        return "en"
+    if kana and kana * 5 >= han:
+        return "ja"
+    if han or kana:
+        return han_language
+    return ""
+
+
+def _han_language(default_language, previous_language):
+    """只含汉字（或假名很少）的句子归为哪种语言：先看所选语音，再看前文最近的中日文句子，最后才当作中文"""
+    if default_language in _HAN_LANGUAGES:
+        return default_language
+    if previous_language in _HAN_LANGUAGES:
+        return previous_language
+    return "zh"
+
+
+def detect_language(text, han_language="zh"):
+    """按字符类别判断一段文本的语言，没有可判断的文字时返回空字符串
+
+    含一定比例假名的为日文，拉丁字母明显多于汉字的为 "en"（法文、德文等同样归入，
+    只表示拉丁字母文本），其余含汉字的为 han_language（日文的汉字句子无法与中文区分）。
+    """
+    return _detect_language(character_classes(text), 0, len(text), han_language)
+
+
+def split_language_spans(text, default_language="zh", target_chars=80, max_chars=200, pieces=None):
+    """混合语言文本的分割：逐句检测语言，并按各自语言的规则整理分块
+
+    返回 (分块位置列表, 对应的语言列表)。没有文字的句子（数字、符号）沿用上一句的语言；
+    只有汉字的句子在所选语音为中文或日文时归为该语言，否则沿用前文最近的中日文句子，都没有时才当作中文。
+    合并短句只发生在相同语言的相邻句子之间。pieces 的含义同 chunk_spans。
+    """
+    sentences = _match_spans(_MIXED_SENTENCE_PATTERN, text)
+    # 只含一种文字时（纯中文、纯英文小说等）无需逐句检测，search 找到第一个字符即返回
+    present = [marker for marker, pattern in _CLASS_PATTERNS.items() if pattern.search(text)]
+    if len(present) <= 1:
+        if not present:
+            language = default_language
+        else:
+            language = _SINGLE_SCRIPT_LANGUAGES.get(present[0]) or _han_language(default_language, None)
+        chunks = chunk_spans(text, sentences, language, target_chars, max_chars, pieces)
+        return chunks, [language] * len(chunks)
+
+    classes = character_classes(text)
+    language = default_language
+    han_context = None  # 前文最近一个中文或日文句子的语言
+    chunks = []
+    languages = []
+    group = []
+    for start, end in sentences:
+        detected = _detect_language(classes, start, end, _han_language(default_language, han_context)) or language
+        if detected in _HAN_LANGUAGES:
+            han_context = detected
+        if group and detected != language:
+            group_chunks = chunk_spans(text, group, language, target_chars, max_chars, pieces)
+            chunks.extend(group_chunks)
+            languages.extend([language] * len(group_chunks))
+            group = []
+        language = detected
+        group.append((start, end))
+    if group:
+        group_chunks = chunk_spans(text, group, language, target_chars, max_chars, pieces)
+        chunks.extend(group_chunks)
+        languages.extend([language] * len(group_chunks))
+    return chunks, languages
@@ -0,0 +1,115 @@
+import asyncio
+import inspect
+import random
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# edge-tts 输出格式：MPEG-2 Layer III，24kHz，48kbps，单声道
+# 帧头 FF F3 64 C4：无CRC，比特率索引6，采样率索引1，单声道，原始文件
+MP3_FRAME_HEADER = b"\xff\xf3\x64\xc4"
+MP3_FRAME_SIZE = 144  # 72 * 48000 / 24000
+MP3_FRAME_DURATION = 576 / 24000  # 每帧时长（秒）
+
+# WordBoundary 的偏移和时长单位为 100 纳秒
+TICKS_PER_SECOND = 10_000_000
+
+
+class SynthesisError(Exception):
+    """合成失败"""
+
+
+class ThrottledError(SynthesisError):
+    """服务端限流"""
+
+
+class TTSBackend:
+    """合成后端接口：stream() 按 edge-tts 的格式逐个产出 audio / WordBoundary 分片"""
+
+    name = "base"
+    cache_namespace = ""  # 缓存键的命名空间，不同后端的音频互不混用
+    warm_up_connections = False  # 是否需要预先建立到合成服务的连接
+
+    async def stream(self, text, voice, rate="+0%", volume="+0%", pitch="+0Hz"):
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+
+class EdgeTTSBackend(TTSBackend):
+    """微软 Edge 在线语音合成"""
+
+    name = "edge"
+    warm_up_connections = True
+
+    def __init__(self, options_provider=None):
+        # 返回 edge_tts.Communicate 附加参数的协程函数（如共享连接池）
+        self.options_provider = options_provider
+        self._supports_boundary = None
+
+    async def stream(self, text, voice, rate="+0%", volume="+0%", pitch="+0Hz"):
+        import edge_tts
+
+        extra_options = await self.options_provider() if self.options_provider else {}
+        if self._supports_boundary is None:
+            self._supports_boundary = "boundary" in inspect.signature(edge_tts.Communicate).parameters
+        if self._supports_boundary:
+            # edge-tts 7 起默认只返回 SentenceBoundary，需要显式请求词边界
+            extra_options["boundary"] = "WordBoundary"
+        communicate = edge_tts.Communicate(text, voice, rate=rate, volume=volume, pitch=pitch, **extra_options)
+        async for chunk in communicate.stream():
+            yield chunk
+
+
+class FakeTTSBackend(TTSBackend):
+    """离线模拟后端：按文本长度返回合法的静音MP3帧，可配置延迟、抖动、失败率和限流率"""
+
+    name = "fake"
+    cache_namespace = "fake"
+
+    def __init__(self, latency=0.5, jitter=0.2, failure_rate=0.0, throttle_rate=0.0,
+                 chars_per_second=5.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+        self.chars_per_second = chars_per_second
+        self._random = random.Random(seed)
+        self.requests = 0
+
+    async def stream(self, text, voice, rate="+0%", volume="+0%", pitch="+0Hz"):
+        self.requests += 1
+        delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        await asyncio.sleep(delay)
+
+        roll = self._random.random()
+        if roll < self.throttle_rate:
+            raise ThrottledError("429 Too Many Requests (模拟限流)")
+        if roll < self.throttle_rate + self.failure_rate:
+            raise ConnectionResetError("模拟网络错误")
+
+        duration = max(0.3, len(text) / self.chars_per_second)
+        frame_count = int(duration / MP3_FRAME_DURATION)
+
+        # 词边界均匀分布在音频时长内
+        words = list(re.finditer(r"\w+|[^\w\s]", text))
+        for i, match in enumerate(words):
+            yield {
+                "type": "WordBoundary",
+                "offset": int(duration * i / len(words) * TICKS_PER_SECOND),
+                "duration": int(duration / len(words) * TICKS_PER_SECOND),
+                "text": match.group(),
+            }
+
+        frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+        for start in range(0, frame_count, 32):
+            yield {"type": "audio", "data": frame * min(32, frame_count - start)}
+
+
+def create_backend(name="edge", options_provider=None, **options):
+    """按名称创建合成后端"""
+    if name == "edge":
+        return EdgeTTSBackend(options_provider)
+    if name == "fake":
+        return FakeTTSBackend(**options)
+    raise ValueError(f"未知的合成后端: {name}")
@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import time
+
+from text_splitter import language_for_locale
+
+logger = logging.getLogger(__name__)
+
+# 离线且没有缓存时使用的内置语音列表 (名称, 性别)
+FALLBACK_VOICES = [
+    # 中文语音
+    ("zh-CN-XiaoxiaoNeural", "Female"),
+    ("zh-CN-YunyeNeural", "Male"),
+    ("zh-CN-YunjianNeural", "Male"),
+    ("zh-CN-XiaoyiNeural", "Female"),
+    ("zh-CN-YunxiNeural", "Male"),
+    ("zh-CN-XiaochenNeural", "Female"),
+    ("zh-CN-XiaohanNeural", "Female"),
+    ("zh-CN-XiaomengNeural", "Female"),
+    ("zh-CN-XiaomoNeural", "Female"),
+    ("zh-CN-XiaoqiuNeural", "Female"),
+    ("zh-CN-XiaoruiNeural", "Female"),
+    ("zh-CN-XiaoshuangNeural", "Female"),
+    ("zh-CN-XiaoxuanNeural", "Female"),
+    ("zh-CN-XiaoyanNeural", "Female"),
+    ("zh-CN-XiaoyouNeural", "Female"),
+    ("zh-CN-XiaozhenNeural", "Female"),
+    # 日文语音
+    ("ja-JP-NanamiNeural", "Female"),
+    ("ja-JP-KeitaNeural", "Male"),
+    ("ja-JP-AoiNeural", "Female"),
+    ("ja-JP-DaichiNeural", "Male"),
+    ("ja-JP-MayuNeural", "Female"),
+    ("ja-JP-NaokiNeural", "Male"),
+    ("ja-JP-ShioriNeural", "Female"),
+    # 英文语音
+    ("en-US-AriaNeural", "Female"),
+    ("en-US-JennyNeural", "Female"),
+    ("en-US-GuyNeural", "Male"),
+    ("en-US-DavisNeural", "Male"),
+    ("en-US-AmberNeural", "Female"),
+    ("en-US-AnaNeural", "Female"),
+    ("en-US-AndrewNeural", "Male"),
+    ("en-US-EmmaNeural", "Female"),
+    ("en-US-BrianNeural", "Male"),
+    ("en-US-ChristopherNeural", "Male"),
+    ("en-US-ElizabethNeural", "Female"),
+    ("en-US-EricNeural", "Male"),
+    ("en-US-JacobNeural", "Male"),
+    ("en-US-JaneNeural", "Female"),
+    ("en-US-JasonNeural", "Male"),
+    ("en-US-MichelleNeural", "Female"),
+    ("en-US-MonicaNeural", "Female"),
+    ("en-US-NancyNeural", "Female"),
+    ("en-US-RogerNeural", "Male"),
+    ("en-US-SaraNeural", "Female"),
+    ("en-US-SteffanNeural", "Male"),
+    ("en-US-TonyNeural", "Male"),
+]
+
+
+def _locale_from_name(name):
+    """zh-CN-XiaoxiaoNeural -> zh-CN"""
+    return "-".join(name.split("-")[:-1]) or name
+
+
+class VoiceCatalog:
+    """语音目录：通过 edge_tts.list_voices 获取，缓存到磁盘并设有效期
+
+    启动时只读本地缓存（没有时用内置列表），过期后在后台刷新。
+    按 (地区, 性别) 预先建立索引，筛选只是一次字典查找。
+    """
+
+    def __init__(self, cache_path="tts_voices.json", ttl_seconds=7 * 24 * 3600):
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self.fetched_at = 0.0
+        self.source = "builtin"  # builtin / cache / online
+        self._voices = {}  # 名称 -> {"name", "locale", "gender"}
+        self._index = {}  # (地区, 性别) -> 名称列表，空字符串表示不限
+        self._set_voices([{"name": name, "locale": _locale_from_name(name), "gender": gender}
+                          for name, gender in FALLBACK_VOICES])
+
+    def load(self):
+        """读取磁盘缓存，文件不存在或损坏时保留内置列表"""
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._set_voices(data["voices"])
+            self.fetched_at = float(data.get("fetched_at", 0))
+            self.source = "cache"
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"语音目录缓存无法读取，使用内置列表: {e}")
+        return self
+
+    def is_stale(self):
+        return time.time() - self.fetched_at > self.ttl_seconds
+
+    async def refresh(self):
+        """联网获取完整语音目录并写入缓存"""
+        import edge_tts
+
+        raw_voices = await edge_tts.list_voices()
+        voices = [
+            {"name": voice["ShortName"], "locale": voice.get("Locale") or _locale_from_name(voice["ShortName"]),
+             "gender": voice.get("Gender", "")}
+            for voice in raw_voices if voice.get("ShortName")
+        ]
+        if not voices:
+            raise ValueError("语音目录为空")
+        self._set_voices(voices)
+        self.fetched_at = time.time()
+        self.source = "online"
+        self._save()
+        logger.info(f"语音目录已更新，共 {len(voices)} 个语音")
+        return self
+
+    def _save(self):
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": self.fetched_at, "voices": list(self._voices.values())}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    def _set_voices(self, voices):
+        by_name = {}
+        index = {}
+        for voice in sorted(voices, key=lambda v: (v["locale"], v["name"])):
+            by_name[voice["name"]] = voice
+            locale, gender = voice["locale"], voice["gender"]
+            for key in ((locale, gender), (locale, ""), ("", gender), ("", "")):
+                index.setdefault(key, []).append(voice["name"])
+        self._voices = by_name
+        self._index = index
+
+    def __len__(self):
+        return len(self._voices)
+
+    def __contains__(self, name):
+        return name in self._voices
+
+    def locales(self):
+        return sorted({locale for locale, _ in self._index if locale})
+
+    def genders(self):
+        return sorted({gender for _, gender in self._index if gender})
+
+    def filter(self, locale="", gender=""):
+        """按地区和性别筛选，空字符串表示不限"""
+        return self._index.get((locale, gender), [])
+
+    def locale_for(self, name):
+        voice = self._voices.get(name)
+        return voice["locale"] if voice else _locale_from_name(name)
+
+    def language_for(self, name):
+        """语音对应的分句规则"""
+        return language_for_locale(self.locale_for(name))
+
+    def voice_for(self, voice, language, language_voices):
+        """为某种语言的句子选择语音：所选语音能读该文字时用所选语音，否则用该语言配置的语音
+
+        检测出的 "en" 表示拉丁字母文本，法语、德语等拉丁字母语音的 language_for 同样是 "en"，
+        所以只有文字不同（如中文语音遇到英文句子）时才换语音。
+        """
+        if not language or language == self.language_for(voice):
+            return voice
+        return language_voices.get(language) or voice
@@ -0,0 +1,64 @@
+from array import array
+from bisect import bisect_right
+
+from tts_backends import TICKS_PER_SECOND
+
+_TICKS_PER_MS = TICKS_PER_SECOND // 1000
+
+
+class WordTimeline:
+    """单句的词边界时间轴
+
+    由合成时的 WordBoundary 事件生成，按开始时间保存四个紧凑数组：
+    开始时间、时长（毫秒）和词在句子文本中的起止位置。
+    播放时按播放时钟二分查找当前词，无需重新扫描文本。
+    """
+
+    def __init__(self, offsets=None, durations=None, starts=None, ends=None):
+        self.offsets = array("l", offsets or [])
+        self.durations = array("l", durations or [])
+        self.starts = array("l", starts or [])
+        self.ends = array("l", ends or [])
+
+    @classmethod
+    def from_boundaries(cls, text, boundaries):
+        """由 WordBoundary 事件生成时间轴，词在文本中按顺序向后查找"""
+        timeline = cls()
+        cursor = 0
+        for boundary in sorted(boundaries, key=lambda b: b["offset"]):
+            word = boundary.get("text", "")
+            if not word:
+                continue
+            start = text.find(word, cursor)
+            if start < 0:
+                continue  # 服务端改写过的词（数字、缩写等）找不到时跳过
+            end = start + len(word)
+            cursor = end
+            timeline.offsets.append(boundary["offset"] // _TICKS_PER_MS)
+            timeline.durations.append(boundary["duration"] // _TICKS_PER_MS)
+            timeline.starts.append(start)
+            timeline.ends.append(end)
+        return timeline
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def locate(self, seconds):
+        """返回播放到 seconds 时正在朗读的词的 (起始, 结束) 位置，词间停顿时返回上一个词"""
+        i = bisect_right(self.offsets, int(seconds * 1000)) - 1
+        if i < 0:
+            return None
+        return self.starts[i], self.ends[i]
+
+    def to_bytes(self):
+        """序列化，供音频缓存保存"""
+        data = array("l")
+        for values in zip(self.offsets, self.durations, self.starts, self.ends):
+            data.extend(values)
+        return data.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        values = array("l")
+        values.frombytes(data)
+        return cls(values[0::4], values[1::4], values[2::4], values[3::4])